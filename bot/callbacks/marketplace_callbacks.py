@@ -5,14 +5,14 @@ import asyncio
 import math
 from aiogram import Router, types
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from bot.messages import Messages
+from bot.messages_en import Messages as MessagesEn
 
 # Create router for marketplace callbacks
 marketplace_router = Router()
 
 def get_messages_class(language='en'):
     """Get appropriate messages class based on language - defaults to English"""
-    from bot.messages import Messages
-    from bot.messages_en import Messages as MessagesEn
     return Messages if language == 'ru' else MessagesEn
 
 def get_user_language(message):
@@ -24,6 +24,24 @@ def get_user_language(message):
             return 'en'
     return 'ru'  # Default to Russian
 
+# Folder and file slugs ("lead-generation", "send_slack_alert.json") -> display titles
+_SLUG_TRANS = str.maketrans('-_', '  ')
+
+def slug_to_title(slug):
+    """Turn a category/subcategory folder or workflow file name into a display title"""
+    return slug.removesuffix('.json').translate(_SLUG_TRANS).title()
+
+def build_marketplace_keyboard(categories, icon="🗂️", callback_prefix="marketplace_cat_"):
+    """Build the marketplace keyboard with one button per category folder"""
+    keyboard_buttons = [
+        [InlineKeyboardButton(
+            text=f"{icon} {slug_to_title(category)}",
+            callback_data=f"{callback_prefix}{category}"
+        )]
+        for category in categories
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+
 async def get_user_language_async(message, supabase_client):
     """Async version for getting user language from database"""
     try:
@@ -57,7 +75,7 @@ async def handle_marketplace_category(callback_query: types.CallbackQuery, supab
             unique_subcategories.sort()
             subcategories = [
                 {
-                    'name': subcat.replace('_', ' ').replace('-', ' ').title(),
+                    'name': slug_to_title(subcat),
                     'folder': subcat  # Keep original for callback data
                 }
                 for subcat in unique_subcategories
@@ -85,7 +103,7 @@ async def handle_marketplace_category(callback_query: types.CallbackQuery, supab
 
         keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
 
-        category_display_name = category_folder.replace('_', ' ').replace('-', ' ').title()
+        category_display_name = slug_to_title(category_folder)
         message_text = f"🗂️ <b>{category_display_name}</b>\n\n{messages_class.AUTOMATIONS_CMD['choose_workflow']}"
 
         await callback_query.message.edit_text(
@@ -103,41 +121,13 @@ async def handle_back_to_marketplace(callback_query: types.CallbackQuery, supaba
     """Handle back to marketplace menu"""
     try:
         # Get distinct categories from documents table
-        response = await asyncio.to_thread(
-            lambda: supabase_client.client.table('documents')
-            .select('category')
-            .not_.is_('category', 'null')
-            .neq('category', '')
-            .execute()
-        )
-
-        # Extract unique categories
-        categories = []
-        if response.data:
-            unique_categories = list(set([doc['category'] for doc in response.data if doc.get('category')]))
-            unique_categories.sort()
-            categories = [
-                {
-                    'name': cat.replace('_', ' ').replace('-', ' ').title(),
-                    'folder': cat  # Keep original for callback data
-                }
-                for cat in unique_categories
-            ]
-
-        # Create keyboard with categories
-        keyboard_buttons = []
+        categories = await supabase_client.get_document_categories()
+        keyboard = build_marketplace_keyboard(categories)
 
         # Get user language for localization
         user_language = await get_user_language_async(callback_query, supabase_client)
         messages_class = get_messages_class(user_language)
 
-        for category in categories:
-            keyboard_buttons.append([
-                InlineKeyboardButton(text=f"🗂️ {category['name']}", callback_data=f"marketplace_cat_{category['folder']}")
-            ])
-
-        keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
-
         # Get appropriate welcome text from messages
         automation_text = messages_class.AUTOMATIONS_CMD["welcome"]
 
@@ -178,50 +168,52 @@ async def handle_marketplace_subcategory(callback_query: types.CallbackQuery, su
         # Get workflows from database for this category and subcategory
         # Include Russian fields and filter based on user language
         if user_language == 'ru':
-            response = await asyncio.to_thread(
-                lambda: supabase_client.client.table('documents')
-                .select('id, name, name_ru, short_description, short_description_ru, description, description_ru, url')
-                .eq('category', category_folder)
-                .eq('subcategory', subcategory_folder)
-                .not_.is_('short_description_ru', 'null')
-                .neq('short_description_ru', '')
-                .execute()
-            )
+            columns = 'id, short_description, short_description_ru'
+            description_field = 'short_description_ru'
         else:
-            response = await asyncio.to_thread(
-                lambda: supabase_client.client.table('documents')
-                .select('id, name, name_ru, short_description, short_description_ru, description, description_ru, url')
+            columns = 'id, short_description'
+            description_field = 'short_description'
+
+        # Pagination settings
+        items_per_page = 6
+
+        def fetch_page(page_number):
+            """Fetch one page of workflows plus the exact total for the pager"""
+            start_idx = (page_number - 1) * items_per_page
+            return (
+                supabase_client.client.table('documents')
+                .select(columns, count='exact')
                 .eq('category', category_folder)
                 .eq('subcategory', subcategory_folder)
-                .not_.is_('short_description', 'null')
-                .neq('short_description', '')
+                .not_.is_(description_field, 'null')
+                .neq(description_field, '')
+                .order('id')
+                .range(start_idx, start_idx + items_per_page - 1)
                 .execute()
             )
 
-        workflows = response.data if response.data else []
+        page = max(1, page)
+        response = await asyncio.to_thread(fetch_page, page)
         messages_class = get_messages_class(user_language)
 
-        # Pagination settings
-        items_per_page = 6
-        total_items = len(workflows)
+        total_items = response.count or 0
         total_pages = math.ceil(total_items / items_per_page) if total_items > 0 else 1
 
-        # Ensure page is within valid range
-        page = max(1, min(page, total_pages))
+        # Ensure page is within valid range (the list may have shrunk since the button was built)
+        if page > total_pages:
+            page = total_pages
+            response = await asyncio.to_thread(fetch_page, page)
 
-        # Get items for current page
-        start_idx = (page - 1) * items_per_page
-        end_idx = start_idx + items_per_page
-        current_workflows = workflows[start_idx:end_idx]
+        current_workflows = response.data if response.data else []
 
         # Create localized message
-        workflow_name = subcategory_folder.replace('_', ' ').replace('-', ' ').title()
-        category_name = category_folder.replace('_', ' ').replace('-', ' ').title()
+        workflow_name = slug_to_title(subcategory_folder)
+        category_name = slug_to_title(category_folder)
 
         message_text = f"⚙️ <b>{workflow_name}</b>\n"
         message_text += f"<b>{messages_class.AUTOMATIONS_CMD['workflow_category_label']}</b> {category_name}\n\n"
 
-        if workflows:
+        if total_items:
             message_text += f"{messages_class.AUTOMATIONS_CMD['available_automations'](total_items)}\n\n"
         else:
             message_text += f"{messages_class.AUTOMATIONS_CMD['no_automations_available']}\n\n"
@@ -358,12 +350,10 @@ async def handle_workflow_detail(callback_query: types.CallbackQuery, supabase_c
             name = workflow_data.get('name', 'Untitled Workflow')
             description = workflow_data.get('description', '')
 
-        if name.endswith('.json'):
-            name = name[:-5]  # Remove .json extension
-        workflow_title = name.replace('-', ' ').replace('_', ' ').title()
+        workflow_title = slug_to_title(name)
 
-        category_name = workflow_data.get('category', '').replace('_', ' ').replace('-', ' ').title()
-        subcategory_name = workflow_data.get('subcategory', '').replace('_', ' ').replace('-', ' ').title()
+        category_name = slug_to_title(workflow_data.get('category', ''))
+        subcategory_name = slug_to_title(workflow_data.get('subcategory', ''))
 
         # Note: Translation service removed - using description as-is
 
@@ -448,21 +438,18 @@ async def handle_request_workflow(callback_query: types.CallbackQuery, supabase_
 
         workflow_data = response.data[0]
         workflow_name = workflow_data.get('name', 'Unknown Workflow')
-        if workflow_name.endswith('.json'):
-            workflow_name = workflow_name[:-5]  # Remove .json extension
-        workflow_name = workflow_name.replace('-', ' ').replace('_', ' ').title()
+        workflow_name = slug_to_title(workflow_name)
 
         category_folder = workflow_data.get('category', 'unknown')
         subcategory_folder = workflow_data.get('subcategory', 'unknown')
-        category_name = category_folder.replace('_', ' ').replace('-', ' ').title()
-        subcategory_name = subcategory_folder.replace('_', ' ').replace('-', ' ').title()
+        category_name = slug_to_title(category_folder)
+        subcategory_name = slug_to_title(subcategory_folder)
 
         # Log the workflow request
         user_id = callback_query.from_user.id
         username = callback_query.from_user.username or "Unknown"
 
         logging.info(f"User {user_id} ({username}) requested workflow: {category_name} / {subcategory_name} / {workflow_name}")
-        print(f"🎯 Workflow Request: User {user_id} ({username}) wants workflow: {category_name} / {subcategory_name} / {workflow_name}")
 
         # Send notification to admin if configured
         try:
@@ -502,22 +489,24 @@ async def handle_automation_category(callback_query: types.CallbackQuery, supaba
         category_id = callback_query.data.replace('automation_cat_', '')
 
         # Use category_id as category name (since we don't have a separate categories table)
-        category_name = category_id.replace('_', ' ').title()
+        category_name = slug_to_title(category_id)
 
         # Get user language
         user_language = await get_user_language_async(callback_query, supabase_client)
         messages_class = get_messages_class(user_language)
 
-        # Fetch automation documents for this category (including Russian fields)
+        # Fetch only the fields the buttons need (including Russian fields)
         # Filter based on user language to show only automations with descriptions in that language
         if user_language == 'ru':
-            response = supabase_client.client.table('documents').select('''
-                id, url, short_description, short_description_ru, name, name_ru, category, subcategory, tags
-            ''').eq('category', category_id).not_.is_('short_description_ru', 'null').neq('short_description_ru', '').limit(10).execute()
+            response = await asyncio.to_thread(
+                lambda: supabase_client.client.table('documents').select('id, short_description, short_description_ru')
+                .eq('category', category_id).not_.is_('short_description_ru', 'null').neq('short_description_ru', '').limit(10).execute()
+            )
         else:
-            response = supabase_client.client.table('documents').select('''
-                id, url, short_description, short_description_ru, name, name_ru, category, subcategory, tags
-            ''').eq('category', category_id).not_.is_('short_description', 'null').neq('short_description', '').limit(10).execute()
+            response = await asyncio.to_thread(
+                lambda: supabase_client.client.table('documents').select('id, short_description')
+                .eq('category', category_id).not_.is_('short_description', 'null').neq('short_description', '').limit(10).execute()
+            )
 
         message_text = messages_class.AUTOMATIONS_CMD["category_header"](category_name)
 
@@ -565,31 +554,13 @@ async def handle_back_to_automations(callback_query: types.CallbackQuery, supaba
     """Handle back to automatizations menu"""
     try:
         # Get distinct categories from documents table
-        response = supabase_client.client.table('documents').select('category').not_.is_('category', 'null').neq('category', '').execute()
-
-        # Extract unique categories
-        categories = []
-        if response.data:
-            unique_categories = list(set([doc['category'] for doc in response.data if doc.get('category')]))
-            unique_categories.sort()
-            categories = [{'id': cat, 'name': cat.replace('_', ' ').title()} for cat in unique_categories[:8]]
-
-        # Create keyboard with categories
-        keyboard_buttons = []
+        categories = await supabase_client.get_document_categories()
+        keyboard = build_marketplace_keyboard(categories[:8], icon="⚙️", callback_prefix="automation_cat_")
 
         # Get user language for localization
         user_language = await get_user_language_async(callback_query, supabase_client)
         messages_class = get_messages_class(user_language)
 
-
-        # Add category buttons
-        for category in categories:
-            keyboard_buttons.append([
-                InlineKeyboardButton(text=f"⚙️ {category['name']}", callback_data=f"automation_cat_{category['id']}")
-            ])
-
-        keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
-
         # Use English messages for callback queries by default
         automation_text = messages_class.AUTOMATIONS_CMD["welcome"]
 
@@ -635,9 +606,7 @@ async def handle_automation_detail(callback_query: types.CallbackQuery, supabase
                 description = doc.get('description', doc.get('short_description', 'No description available'))
 
             # Clean name formatting
-            if name.endswith('.json'):
-                name = name[:-5]  # Remove .json extension
-            name = name.replace('-', ' ').replace('_', ' ').title()
+            name = slug_to_title(name)
             url = doc.get('url', '#')
 
             # Get category info from the new schema
@@ -700,7 +669,6 @@ async def handle_get_automation(callback_query: types.CallbackQuery, supabase_cl
         username = callback_query.from_user.username or "Unknown"
 
         logging.info(f"User {user_id} ({username}) requested automation {automation_id}")
-        print(f"🎯 Automation Request: User {user_id} ({username}) wants automation {automation_id}")
 
         # Send notification to admin
         try:
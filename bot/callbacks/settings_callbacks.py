@@ -12,7 +12,7 @@ async def back_to_settings(callback_query: types.CallbackQuery, supabase_client)
     """Go back to main settings menu"""
     try:
         # Get current user settings from database
-        user = await supabase_client.get_user_by_telegram_id(callback_query.from_user.id)
+        user = await supabase_client.get_user_by_telegram_id(callback_query.from_user.id, use_cache=False)
 
         if user:
             audio_status = "🔊 Аудио" if user.isAudio else "📝 Текст"
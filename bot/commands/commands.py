@@ -1,5 +1,5 @@
 import logging
-import asyncio
+import re
 from aiogram import Router, types
 from aiogram.filters import CommandStart, Command
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
@@ -8,6 +8,12 @@ from aiogram.fsm.state import State, StatesGroup
 from bot.messages import Messages
 from bot.messages_en import Messages as MessagesEn
 from bot.config import Config
+from bot.callbacks.marketplace_callbacks import build_marketplace_keyboard
+
+# Any Cyrillic character marks the text as Russian
+CYRILLIC_RE = re.compile(r'[\u0400-\u04FF]')
+# Words that suggest an English-speaking user
+ENGLISH_KEYWORDS = ('start', 'help', 'about', 'settings', 'hello', 'hi')
 
 async def get_user_language_async(message, supabase_client):
     """Async version: Detect user language from database settings, message or user settings"""
@@ -25,10 +31,6 @@ async def get_user_language_async(message, supabase_client):
     # Use fallback logic
     return get_user_language_fallback(message)
 
-def get_user_language(message):
-    """Synchronous fallback version: Detect user language from message or Telegram settings"""
-    return get_user_language_fallback(message)
-
 def get_user_language_fallback(message):
     """Fallback logic for language detection"""
     # Check user's Telegram language code
@@ -40,20 +42,21 @@ def get_user_language_fallback(message):
 
     # Check message text for language indicators
     if hasattr(message, 'text') and message.text:
-        # Check for Cyrillic characters (indicates Russian)
-        if any('\u0400' <= char <= '\u04FF' for char in message.text):
+        # Check for Cyrillic characters (indicates Russian); pure-ASCII text can't contain any
+        if not message.text.isascii() and CYRILLIC_RE.search(message.text):
             return 'ru'
 
         # Check for English keywords
-        english_keywords = ['start', 'help', 'about', 'settings', 'hello', 'hi']
         text_lower = message.text.lower()
-        for keyword in english_keywords:
-            if keyword in text_lower:
-                return 'en'
+        if any(keyword in text_lower for keyword in ENGLISH_KEYWORDS):
+            return 'en'
 
     # Default to Russian (since most users seem to prefer Russian)
     return 'ru'
 
+# Synchronous version has no database access, so it is exactly the fallback logic
+get_user_language = get_user_language_fallback
+
 def get_messages_class(language='en'):
     """Get appropriate messages class based on language - defaults to English"""
     return Messages if language == 'ru' else MessagesEn
@@ -124,44 +127,15 @@ async def list_marketplace(message: types.Message, supabase_client):
     """Show marketplace with workflow categories from Supabase documents table"""
     try:
         # Get distinct categories from documents table
-        response = await asyncio.to_thread(
-            lambda: supabase_client.client.table('documents')
-            .select('category')
-            .not_.is_('category', 'null')
-            .neq('category', '')
-            .execute()
-        )
+        categories = await supabase_client.get_document_categories()
+        keyboard = build_marketplace_keyboard(categories)
 
-        # Extract unique categories
-        categories = []
-        if response.data:
-            unique_categories = list(set([doc['category'] for doc in response.data if doc.get('category')]))
-            unique_categories.sort()
-            categories = [
-                {
-                    'name': cat.replace('_', ' ').replace('-', ' ').title(),
-                    'folder': cat  # Keep original for callback data
-                }
-                for cat in unique_categories
-            ]
-        
-        # Create keyboard with categories
-        keyboard_buttons = []
-        
-        # Add category buttons
         user_language = await get_user_language_async(message, supabase_client)
-        print(f"🔍 Marketplace: User {message.from_user.id} detected language: {user_language}")
+        logging.debug(f"🔍 Marketplace: User {message.from_user.id} detected language: {user_language}")
         messages_class = get_messages_class(user_language)
-        
-        for category in categories:
-            keyboard_buttons.append([
-                InlineKeyboardButton(text=f"🗂️ {category['name']}", callback_data=f"marketplace_cat_{category['folder']}")
-            ])
-        
-        keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
-        
+
         # Log the command access
-        print(f"🛒 Marketplace command: User {message.from_user.id} ({message.from_user.username}) accessing marketplace")
+        logging.debug(f"🛒 Marketplace command: User {message.from_user.id} ({message.from_user.username}) accessing marketplace")
         logging.info(f"Marketplace command: User {message.from_user.id} accessing marketplace")
         
         # Get appropriate welcome text from messages
@@ -223,7 +197,7 @@ async def subscribe_command(message: types.Message, supabase_client):
 
         # Create Stripe payment URL button with user ID (opens in external browser)
         payment_url_with_user_id = f"{Config.STRIPE_PAYMENT_LINK}?client_reference_id={message.from_user.id}"
-        print(f"🔗 Using payment link: {payment_url_with_user_id}")
+        logging.debug(f"🔗 Using payment link: {payment_url_with_user_id}")
         stripe_button = InlineKeyboardButton(
             text=messages_class.SUBSCRIBE_CMD["button_text"],
             url=payment_url_with_user_id
@@ -232,7 +206,7 @@ async def subscribe_command(message: types.Message, supabase_client):
         keyboard = InlineKeyboardMarkup(inline_keyboard=[[stripe_button]])
 
         # Log the subscription access
-        print(f"🔥 Subscribe command: User {message.from_user.id} ({message.from_user.username}) accessing subscription")
+        logging.debug(f"🔥 Subscribe command: User {message.from_user.id} ({message.from_user.username}) accessing subscription")
         logging.info(f"Subscribe command: User {message.from_user.id} accessing subscription")
 
         message_text = messages_class.SUBSCRIBE_CMD["title"] + messages_class.SUBSCRIBE_CMD["description"]
@@ -258,7 +232,7 @@ async def settings_command(message: types.Message, supabase_client):
         messages_class = get_messages_class(user_language)
 
         # Get current user settings from database
-        user = await supabase_client.get_user_by_telegram_id(message.from_user.id)
+        user = await supabase_client.get_user_by_telegram_id(message.from_user.id, use_cache=False)
 
         if user:
             # Use messages from message files
@@ -331,9 +305,9 @@ async def command_request(message: types.Message, state: FSMContext, supabase_cl
     """Help command - initiate question asking"""
     # Get user language and appropriate messages
     user_language = await get_user_language_async(message, supabase_client)
-    print(f"🔍 Help command - User {message.from_user.id} detected language: {user_language}")
+    logging.debug(f"🔍 Help command - User {message.from_user.id} detected language: {user_language}")
     messages_class = get_messages_class(user_language)
-    print(f"🔍 Help command - Using messages class: {messages_class.__name__ if hasattr(messages_class, '__name__') else type(messages_class)}")
+    logging.debug(f"🔍 Help command - Using messages class: {messages_class.__name__}")
 
     await message.answer(messages_class.HELP_CMD["ask_question"], parse_mode="HTML")
     await state.set_state(UserState.help)
@@ -15,6 +15,7 @@ class Config:
     EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-3-large')
     GPT_MODEL = os.getenv('GPT_MODEL', 'gpt-4o-mini')
     SEARCH_LIMIT = int(os.getenv('SEARCH_LIMIT', '5'))
+    SIMILARITY_THRESHOLD = float(os.getenv('SIMILARITY_THRESHOLD', '0.3'))
     
     DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
     RATE_LIMIT_REQUESTS_PER_DAY = int(os.getenv('RATE_LIMIT_REQUESTS_PER_DAY', '50'))
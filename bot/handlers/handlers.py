@@ -1,8 +1,10 @@
+import asyncio
 import logging
 import tempfile
 import os
 import json
 import time
+from collections import OrderedDict
 from aiogram import Router, types, F
 from aiogram.enums import ChatAction
 from aiogram.fsm.context import FSMContext
@@ -13,6 +15,8 @@ from bot.messages_en import Messages as MessagesEn
 from bot.messages import Messages as MessagesRu
 import openai
 
+logger = logging.getLogger(__name__)
+
 # Create router for question handling
 question_router = Router()
 
@@ -54,6 +58,38 @@ def get_proper_title(content_type, original_title):
 # In-memory storage for pagination (in production, use Redis or database)
 user_pagination_data = {}
 
+# LRU of recent query embeddings - repeated questions skip the embeddings API call
+EMBEDDING_CACHE_SIZE = 1024
+_embedding_cache = OrderedDict()
+
+# Shared API clients - created once so connection pools are reused across messages
+_openai_client = None
+_tts_service = None
+
+def get_openai_client():
+    """Get shared OpenAI client instance"""
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = openai.AsyncOpenAI()
+    return _openai_client
+
+def get_tts_service():
+    """Get shared ElevenLabs text-to-speech service instance"""
+    global _tts_service
+    if _tts_service is None:
+        _tts_service = TextToSpeechService()
+    return _tts_service
+
+async def close_shared_clients():
+    """Close the shared API clients' connection pools (called on bot shutdown)"""
+    global _openai_client, _tts_service
+    if _tts_service is not None:
+        await _tts_service.aclose()
+        _tts_service = None
+    if _openai_client is not None:
+        await _openai_client.close()
+        _openai_client = None
+
 async def transcribe_voice_cloud(message: types.Message) -> str:
     """Transcribe voice message using OpenAI Whisper API"""
     # Get the file
@@ -66,7 +102,7 @@ async def transcribe_voice_cloud(message: types.Message) -> str:
             await message.bot.download_file(file.file_path, temp_file.name)
             
             # Use OpenAI Whisper API for transcription (v1.0+ syntax)
-            client = openai.AsyncOpenAI()
+            client = get_openai_client()
             with open(temp_file.name, 'rb') as audio_file:
                 transcript = await client.audio.transcriptions.create(
                     model="whisper-1",
@@ -82,6 +118,46 @@ async def transcribe_voice_cloud(message: types.Message) -> str:
             os.unlink(temp_file.name)
 
 
+async def get_query_embedding(client, text: str) -> list:
+    """Return the embedding for text, reusing recent results from an in-process LRU"""
+    key = text.strip()
+    embedding = _embedding_cache.get(key)
+    if embedding is not None:
+        _embedding_cache.move_to_end(key)
+        return embedding
+
+    embedding_response = await client.embeddings.create(
+        input=key,
+        model="text-embedding-3-large"
+    )
+    embedding = embedding_response.data[0].embedding
+
+    _embedding_cache[key] = embedding
+    if len(_embedding_cache) > EMBEDDING_CACHE_SIZE:
+        _embedding_cache.popitem(last=False)
+    return embedding
+
+
+async def find_similar_automations(client, supabase_client, user_text: str, user_language: str) -> list:
+    """Embed the user query and return similar automations (empty list on failure)"""
+    try:
+        # Generate embedding for the user query
+        query_embedding = await get_query_embedding(client, user_text)
+
+        # Search for similar automations in the database
+        search_results = await supabase_client.search_automations_by_similarity(
+            query_embedding=query_embedding,
+            limit=3,
+            user_language=user_language
+        )
+        return search_results or []
+
+    except Exception as vector_error:
+        # Continue without similar automations if vector search fails
+        logger.error(f"Vector search failed: {vector_error}")
+        return []
+
+
 @question_router.message(F.text | F.voice | F.audio)
 async def handle_user_question(message: types.Message, state: FSMContext, supabase_client):
     """Handle user questions with RAG pipeline"""
@@ -132,62 +208,44 @@ async def handle_user_question(message: types.Message, state: FSMContext, supaba
             action=ChatAction.TYPING
         )
 
-        # STEP 1: ChatGPT Recommendations with localized prompt
-        client = openai.AsyncOpenAI()
+        # STEP 1 + 2: ChatGPT recommendations and vector similarity search are
+        # independent, so run them concurrently instead of back to back
+        client = get_openai_client()
 
         # Use localized prompt based on user language
         chatgpt_prompt = messages_class.RAG_PROMPT
 
-        chatgpt_response = await client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": chatgpt_prompt},
-                {"role": "user", "content": f"Automation task: {user_text}"}
-            ],
-            max_tokens=500,
-            temperature=0.7
+        chatgpt_response, similar_automations = await asyncio.gather(
+            client.chat.completions.create(
+                model="gpt-4",
+                messages=[
+                    {"role": "system", "content": chatgpt_prompt},
+                    {"role": "user", "content": f"Automation task: {user_text}"}
+                ],
+                max_tokens=500,
+                temperature=0.7
+            ),
+            find_similar_automations(client, supabase_client, user_text, user_language)
         )
-        
+
         chatgpt_text = chatgpt_response.choices[0].message.content
-        
-        # STEP 2: Vector Similarity Search for Similar Automations
-        similar_automations = []
+
         keyboard = None
-        
-        try:
-            # Generate embedding for the user query
-            embedding_response = await client.embeddings.create(
-                input=user_text,
-                model="text-embedding-3-large"
-            )
-            query_embedding = embedding_response.data[0].embedding
-            
-            # Search for similar automations in the database
-            search_results = await supabase_client.search_automations_by_similarity(
-                query_embedding=query_embedding,
-                limit=3,
-                user_language=user_language
-            )
-            
-            if search_results:
-                similar_automations = search_results
-                
-                # Create inline keyboard with similar automations (no header button)
-                keyboard_buttons = []
-                
-                for i, automation in enumerate(similar_automations[:3]):
-                    button_text = f"⚙️ {automation.get('title', 'Automation')[:40]}..."
-                    keyboard_buttons.append([InlineKeyboardButton(
-                        text=button_text,
-                        callback_data=f"automation_detail_{automation.get('id')}"
-                    )])
-                
-                keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
-                
-        except Exception as vector_error:
-            logger.error(f"Vector search failed: {vector_error}")
-            # Continue without similar automations if vector search fails
-        
+        if similar_automations:
+            # Create inline keyboard with similar automations (no header button)
+            keyboard_buttons = []
+
+            for automation in similar_automations:
+                # Truncate once and only add the ellipsis when the title was actually cut
+                title = automation.get('title', 'Automation')
+                button_text = f"⚙️ {title[:40]}..." if len(title) > 40 else f"⚙️ {title}"
+                keyboard_buttons.append([InlineKeyboardButton(
+                    text=button_text,
+                    callback_data=f"automation_detail_{automation.get('id')}"
+                )])
+
+            keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+
         # Combine responses
         response_text = final_response = chatgpt_text
         
@@ -201,10 +259,10 @@ async def handle_user_question(message: types.Message, state: FSMContext, supaba
             try:
                 # Generate audio using ElevenLabs
                 logging.info(f"🎧 Generating audio response for user {message.from_user.id}")
-                tts_service = TextToSpeechService()
+                tts_service = get_tts_service()
                 
                 # Generate audio file (use only ChatGPT response for audio, not buttons)
-                audio_path = tts_service.text_to_speech(
+                audio_path = await tts_service.atext_to_speech(
                     text=chatgpt_text,  # Only ChatGPT text for audio
                     quality_preset="conversational",  # Good for bot responses
                     output_filename=f"response_{message.from_user.id}_{int(time.time())}.mp3"
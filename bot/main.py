@@ -5,7 +5,7 @@ from aiogram.fsm.storage.memory import MemoryStorage
 from bot.config import Config
 from bot.supabase_client import SupabaseClient
 from bot.commands.commands import start_router, content_router
-from bot.handlers.handlers import question_router
+from bot.handlers.handlers import question_router, close_shared_clients
 from bot.callbacks.language_callbacks import language_router
 from bot.callbacks.settings_callbacks import settings_router
 from bot.callbacks.marketplace_callbacks import marketplace_router
@@ -42,10 +42,7 @@ async def main():
         
         # Initialize Supabase client
         try:
-            supabase_client = SupabaseClient(
-                supabase_url=Config.SUPABASE_URL,
-                supabase_key=Config.SUPABASE_KEY
-            )
+            supabase_client = SupabaseClient.get_default()
             logger.info("Supabase client initialized successfully")
         except Exception as e:
             logger.error(f"Error initializing Supabase client with URL '{Config.SUPABASE_URL}': {e}")
@@ -73,6 +70,9 @@ async def main():
             data['supabase_client'] = supabase_client
             return await handler(event, data)
         
+        # Release pooled HTTP connections when polling stops
+        dp.shutdown.register(close_shared_clients)
+        
         logger.info("Bot initialized successfully")
         
         # Start polling
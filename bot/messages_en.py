@@ -1,3 +1,9 @@
+# Shared message fragments, concatenated once at import time
+_SORRY = "❌ Sorry, "
+_TRY_LATER = " Please try again later."
+_ERROR_LOADING = "Error loading "
+
+
 class Messages:
     START_CMD = {
         "welcome": lambda user_name: (
@@ -22,11 +28,11 @@ class Messages:
 
     VIDEOS_CMD = {
         "list": "Select a video to watch 🎥",
-        "not_found": "❌ Sorry, the video was not found.",
+        "not_found": _SORRY + "the video was not found.",
         "no_videos": "📭 No video files are currently available.",
         "button_text": lambda filename: f"🎥 Watch: {filename}",
         "error": lambda error: f"❌ An error occurred: {error}",
-        "processing_error": "❌ Sorry, there was an error processing the video. Please try again later.",
+        "processing_error": _SORRY + "there was an error processing the video." + _TRY_LATER,
         "large_file": "📢 This video is too large to send directly. Please use the web player:",
         "streaming_caption": lambda video_name: f"▶️ Streaming: {video_name}",
         "web_player_button": "🌐 Watch in Web Player"
@@ -118,19 +124,19 @@ class Messages:
         "no_summaries": "📭 No summary files are currently available.",
         "select_summary": "📋 Select a video to view its summary:",
         "summary_header": lambda filename: f"📝 Summary for {filename}:\n\n",
-        "file_error": "❌ Sorry, there was an error reading the summary file. Please try again later."
+        "file_error": _SORRY + "there was an error reading the summary file." + _TRY_LATER
     }
 
     HISTORY_CMD = {
         "no_history": "📭 You haven't made any search requests yet.",
         "history_header": "📋 Your recent search history:\n\n",
-        "error": "❌ Sorry, there was an error retrieving your history. Please try again later."
+        "error": _SORRY + "there was an error retrieving your history." + _TRY_LATER
     }
 
     AUDIO_CMD = {
         "processing": "🎧 Processing your audio message...",
-        "no_speech_detected": "❌ Sorry, I couldn't detect any speech in this audio.",
-        "transcription_error": "❌ Sorry, I had trouble understanding the audio. Please try again.",
+        "no_speech_detected": _SORRY + "I couldn't detect any speech in this audio.",
+        "transcription_error": _SORRY + "I had trouble understanding the audio. Please try again.",
         "processing_error": "❌ An error occurred while processing your audio message. Please try again.",
     }
 
@@ -156,7 +162,7 @@ class Messages:
         "get_automation_button": "✅ Get this automation",
         "back_button": "⬅️ Back",
         "back_to_category": "⬅️ Back to category",
-        "loading_error": "Error loading automations.",
+        "loading_error": _ERROR_LOADING + "automations.",
         "choose_workflow": "Choose an Automation:",
         # Workflow detail labels
         "workflow_detail_title": "🔧 Automation Details",
@@ -188,7 +194,7 @@ class Messages:
         "title": "📅 *Session Booking*\n\n",
         "description": "Choose a convenient time for consultation through Calendly.\nClick the button below to open the calendar:",
         "button_text": "📅 Book a session",
-        "loading_error": "Error loading booking calendar."
+        "loading_error": _ERROR_LOADING + "booking calendar."
     }
 
     HELP_CMD = {
@@ -208,7 +214,7 @@ class Messages:
             "Click the button below to subscribe:"
         ),
         "button_text": "💳 Subscribe Now",
-        "loading_error": "Error loading payment page.",
+        "loading_error": _ERROR_LOADING + "payment page.",
         "payment_success": "✅ <b>Subscription successful!</b>\n\nYou now have access to all premium features. Welcome to the automation club! 🚀",
         "payment_error": "❌ Payment processing error occurred. Please try again or contact support."
     }
@@ -217,7 +223,7 @@ class Messages:
         "title": "💳 *Service Payment*\n\n",
         "description": "Click the button below for secure payment through Stripe:",
         "button_text": "💳 Pay for service",
-        "loading_error": "Error loading payment page."
+        "loading_error": _ERROR_LOADING + "payment page."
     }
 
     RAG_PROMPT = """You are an n8n automation expert. Answer ONLY automation-related questions.
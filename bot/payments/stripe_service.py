@@ -60,6 +60,7 @@ class StripeService:
                     'customer_id': data.get('customer'),
                     'payment_intent': data.get('payment_intent'),
                     'amount_total': data.get('amount_total', 0) / 100,  # Convert from cents
+                    'currency': data.get('currency'),
                     'metadata': data.get('metadata', {}),
                     'client_reference_id': data.get('client_reference_id'),  # Added this field
                     'subscription_id': data.get('subscription')
@@ -69,6 +70,7 @@ class StripeService:
                     'customer_id': data.get('customer'),
                     'payment_intent': data.get('id'),
                     'amount': data.get('amount', 0) / 100,  # Convert from cents
+                    'currency': data.get('currency'),
                     'metadata': data.get('metadata', {}),
                     'subscription_id': data.get('invoice', {}).get('subscription') if 'invoice' in data else None
                 }
@@ -77,6 +79,7 @@ class StripeService:
                     'customer_id': data.get('customer'),
                     'subscription_id': data.get('subscription'),
                     'amount': data.get('amount_paid', 0) / 100,  # Convert from cents
+                    'currency': data.get('currency'),
                     'metadata': data.get('metadata', {}),
                     'period_start': datetime.fromtimestamp(data.get('period_start', 0)),
                     'period_end': datetime.fromtimestamp(data.get('period_end', 0))
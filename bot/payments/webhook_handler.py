@@ -68,24 +68,26 @@ async def handle_stripe_webhook(request: Request, bot: Bot, supabase_client):
 async def process_successful_payment(bot: Bot, supabase_client, telegram_id: int, customer_info: dict, event: dict):
     """Process successful payment and update user subscription"""
     try:
-        # Get user from database
-        user = await supabase_client.get_user_by_telegram_id(telegram_id)
-        if not user:
-            logger.error(f"User {telegram_id} not found in database")
-            return
-
         # Calculate subscription period
         subscription_period = stripe_service.calculate_subscription_period()
 
         # Update user subscription status (using existing fields for now)
         subscription_data = {
-            'telegram_id': telegram_id,
             # Use notification field as premium status indicator for now
             'notification': True,  # This can represent premium status
         }
 
-        # Update user in database
-        await supabase_client.create_or_update_user(subscription_data)
+        # Record payment and subscription in one UPDATE; no matching row means the user is unknown
+        updated = await supabase_client.update_user_payment_and_subscription(
+            telegram_id,
+            payment_status=True,
+            subscription_data=subscription_data,
+            payment_amount=customer_info.get('amount', customer_info.get('amount_total')),
+            payment_currency=customer_info.get('currency')
+        )
+        if not updated:
+            logger.error(f"User {telegram_id} not found in database")
+            return
 
         # Send success message to user
         await send_subscription_success_message(bot, telegram_id, supabase_client)
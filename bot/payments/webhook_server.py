@@ -15,9 +15,8 @@ logger = logging.getLogger(__name__)
 # Create FastAPI app
 app = FastAPI(title="Payment Webhook Server", version="1.0.0")
 
-# Global variables for bot and supabase client
+# Global variable for bot instance
 _bot_instance = None
-_supabase_instance = None
 
 def get_bot():
     """Get bot instance"""
@@ -28,13 +27,7 @@ def get_bot():
 
 def get_supabase():
     """Get Supabase client instance"""
-    global _supabase_instance
-    if _supabase_instance is None:
-        _supabase_instance = SupabaseClient(
-            supabase_url=Config.SUPABASE_URL,
-            supabase_key=Config.SUPABASE_KEY
-        )
-    return _supabase_instance
+    return SupabaseClient.get_default()
 
 @app.post("/webhook/stripe")
 async def stripe_webhook_endpoint(
@@ -5,13 +5,16 @@ All functionality in a single file
 """
 
 import argparse
+import asyncio
 import sys
 import os
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 import time
 import re
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -23,6 +26,10 @@ class TextToSpeechService:
     A service for converting text to speech using ElevenLabs API
     """
     
+    # After a failed async request, skip further API calls for this long (shared by all instances)
+    FAILURE_COOLDOWN_SECONDS = 30
+    _failure_cooldown_until = 0.0
+    
     def __init__(self, api_key: Optional[str] = None):
         self.api_key = api_key or os.getenv('ELEVENLABS_API_KEY')
         if not self.api_key or self.api_key == 'your_api_key_here':
@@ -41,6 +48,12 @@ class TextToSpeechService:
             "Content-Type": "application/json",
             "xi-api-key": self.api_key
         }
+
+        # Keep-alive session so repeated requests reuse the TCP+TLS connection
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+        # Created lazily on first async call, inside the running event loop
+        self._async_client: Optional[httpx.AsyncClient] = None
     
 
     def get_audio_quality_presets(self) -> Dict[str, Dict]:
@@ -79,9 +92,9 @@ class TextToSpeechService:
         sanitized = re.sub(r'[<>:"/\\|?*]', '_', filename).strip(' .')
         return sanitized if sanitized else f"speech_{int(time.time())}"
     
-    def text_to_speech(self, text: str, voice_id: Optional[str] = None, model: Optional[str] = None, 
-                      voice_settings: Optional[Dict] = None, quality_preset: Optional[str] = None, 
-                      output_filename: Optional[str] = None) -> str:
+    def _prepare_speech_request(self, text: str, voice_id: Optional[str], model: Optional[str],
+                                voice_settings: Optional[Dict], quality_preset: Optional[str],
+                                output_filename: Optional[str]) -> Tuple[str, Dict, Path]:
         # Input validation
         if not isinstance(text, str) or not text.strip():
             raise ValueError("Text cannot be empty")
@@ -105,35 +118,45 @@ class TextToSpeechService:
             output_filename += f'.{self.audio_format}'
         
         output_path = self.output_dir / output_filename
-        
+        url = f"{self.base_url}/text-to-speech/{voice_id}"
         data = {"text": text, "model_id": model, "voice_settings": voice_settings}
+        return url, data, output_path
+    
+    def _check_speech_status(self, status_code: int) -> None:
+        if status_code == 401:
+            raise Exception("Authentication failed. Please check your API key")
+        elif status_code == 402:
+            raise Exception("Insufficient quota. Please check your account balance")
+        elif status_code == 422:
+            raise ValueError("Invalid request parameters")
+        elif status_code == 429:
+            raise Exception("Rate limit exceeded. Please try again later")
+    
+    def _save_audio(self, content: bytes, output_path: Path) -> str:
+        if len(content) == 0:
+            raise Exception("Received empty audio data")
+        
+        with open(output_path, 'wb') as f:
+            f.write(content)
+        
+        if not output_path.exists() or output_path.stat().st_size == 0:
+            raise Exception("Audio file was not created successfully")
+        
+        print(f"Audio saved to: {output_path}")
+        return str(output_path)
+    
+    def text_to_speech(self, text: str, voice_id: Optional[str] = None, model: Optional[str] = None, 
+                      voice_settings: Optional[Dict] = None, quality_preset: Optional[str] = None, 
+                      output_filename: Optional[str] = None) -> str:
+        url, data, output_path = self._prepare_speech_request(
+            text, voice_id, model, voice_settings, quality_preset, output_filename
+        )
         
         try:
-            url = f"{self.base_url}/text-to-speech/{voice_id}"
-            response = requests.post(url, json=data, headers=self.headers, timeout=30)
-            
-            if response.status_code == 401:
-                raise Exception("Authentication failed. Please check your API key")
-            elif response.status_code == 402:
-                raise Exception("Insufficient quota. Please check your account balance")
-            elif response.status_code == 422:
-                raise ValueError("Invalid request parameters")
-            elif response.status_code == 429:
-                raise Exception("Rate limit exceeded. Please try again later")
-            
+            response = self.session.post(url, json=data, headers=self.headers, timeout=30)
+            self._check_speech_status(response.status_code)
             response.raise_for_status()
-            
-            if len(response.content) == 0:
-                raise Exception("Received empty audio data")
-            
-            with open(output_path, 'wb') as f:
-                f.write(response.content)
-            
-            if not output_path.exists() or output_path.stat().st_size == 0:
-                raise Exception("Audio file was not created successfully")
-            
-            print(f"Audio saved to: {output_path}")
-            return str(output_path)
+            return self._save_audio(response.content, output_path)
         
         except requests.exceptions.Timeout:
             raise Exception("Request timed out. Please try again")
@@ -142,11 +165,58 @@ class TextToSpeechService:
         except requests.exceptions.RequestException as e:
             raise Exception(f"Failed to generate speech: {str(e)}")
     
+    async def atext_to_speech(self, text: str, voice_id: Optional[str] = None, model: Optional[str] = None,
+                              voice_settings: Optional[Dict] = None, quality_preset: Optional[str] = None,
+                              output_filename: Optional[str] = None) -> str:
+        """Async variant of text_to_speech that does not block the event loop"""
+        url, data, output_path = self._prepare_speech_request(
+            text, voice_id, model, voice_settings, quality_preset, output_filename
+        )
+        
+        # A recent failure (quota, auth, outage) short-circuits to the caller's fallback
+        if time.monotonic() < TextToSpeechService._failure_cooldown_until:
+            raise Exception("Text-to-speech temporarily disabled after a recent failure")
+        
+        try:
+            return await self._post_speech(url, data, output_path)
+        except ValueError:
+            raise
+        except Exception:
+            TextToSpeechService._failure_cooldown_until = time.monotonic() + self.FAILURE_COOLDOWN_SECONDS
+            raise
+    
+    async def aclose(self) -> None:
+        """Close the pooled async HTTP client, if one was created"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+    
+    async def _post_speech(self, url: str, data: Dict, output_path: Path) -> str:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                timeout=30,
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+            )
+        
+        try:
+            response = await self._async_client.post(url, json=data, headers=self.headers)
+            self._check_speech_status(response.status_code)
+            response.raise_for_status()
+            # Disk write off the event loop
+            return await asyncio.to_thread(self._save_audio, response.content, output_path)
+        
+        except httpx.TimeoutException:
+            raise Exception("Request timed out. Please try again")
+        except httpx.ConnectError:
+            raise Exception("Connection error. Please check your internet connection")
+        except httpx.HTTPError as e:
+            raise Exception(f"Failed to generate speech: {str(e)}")
+    
     def get_account_info(self) -> Dict:
         try:
             url = f"{self.base_url}/user"
             headers = {"xi-api-key": self.api_key}
-            response = requests.get(url, headers=headers)
+            response = self.session.get(url, headers=headers)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
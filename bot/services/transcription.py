@@ -1,8 +1,14 @@
+import asyncio
 import openai
 from bot.config import Config
 import logging
 import os
 
+def _transcribe_file(client, audio_file_path: str, **params):
+    """Blocking Whisper API call; run it via asyncio.to_thread"""
+    with open(audio_file_path, "rb") as audio_file:
+        return client.audio.transcriptions.create(file=audio_file, **params)
+
 async def transcribe_audio(audio_file_path: str) -> str:
     """
     Transcribe audio file using OpenAI Whisper API
@@ -21,13 +27,14 @@ async def transcribe_audio(audio_file_path: str) -> str:
         # Initialize OpenAI client
         client = openai.OpenAI(api_key=Config.OPENAI_API_KEY)
         
-        # Open and transcribe the audio file
-        with open(audio_file_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                response_format="text"
-            )
+        # Transcribe in a worker thread so the sync client doesn't block the event loop
+        transcript = await asyncio.to_thread(
+            _transcribe_file,
+            client,
+            audio_file_path,
+            model="whisper-1",
+            response_format="text"
+        )
         
         return transcript.strip() if transcript else ""
         
@@ -66,12 +73,10 @@ async def transcribe_audio_with_language(audio_file_path: str, language: str = N
         if language:
             transcription_params["language"] = language
         
-        # Open and transcribe the audio file
-        with open(audio_file_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                file=audio_file,
-                **transcription_params
-            )
+        # Transcribe in a worker thread so the sync client doesn't block the event loop
+        transcript = await asyncio.to_thread(
+            _transcribe_file, client, audio_file_path, **transcription_params
+        )
         
         return {
             "text": transcript.text.strip() if transcript.text else "",
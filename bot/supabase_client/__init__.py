@@ -1,4 +1,5 @@
 from .client import SupabaseClient
 from .models import User
+from .query_cache import QueryCache
 
-__all__ = ['SupabaseClient', 'User']
\ No newline at end of file
+__all__ = ['SupabaseClient', 'User', 'QueryCache']
\ No newline at end of file
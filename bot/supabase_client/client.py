@@ -1,44 +1,110 @@
 import asyncio
-import os
+import hashlib
+import logging
+from array import array
 from typing import List, Optional, Dict, Any
 from supabase import create_client, Client
+from postgrest.exceptions import APIError
+from bot.config import Config
 from .models import User
+from .query_cache import QueryCache
+
+logger = logging.getLogger(__name__)
+
+# Users are resolved on every incoming message; keep recent ones for a short while.
+# The cache is per process: writes made by the webhook server (run_with_payments.py starts it
+# as a separate process) only show up here once the entry expires, so screens that display
+# payment/notification state read with use_cache=False
+USER_CACHE_SIZE = 10_000
+USER_CACHE_TTL_SECONDS = 60
+
+# Read once at import; changing SIMILARITY_THRESHOLD requires a restart
+DEFAULT_SIMILARITY_THRESHOLD = Config.SIMILARITY_THRESHOLD
+
+# Slug-style document names ("send-slack_alert.json") -> "Send Slack Alert"
+_DASH_UNDERSCORE = str.maketrans('-_', '  ')
+_UNNAMED_AUTOMATION = {'en': 'Unnamed Automation', 'ru': 'Безымянная автоматизация'}
+
+# PostgREST / Postgres codes for a column that doesn't exist on the table
+_MISSING_COLUMN_CODES = ('PGRST204', '42703')
+
+# Similarity results for repeated questions. Documents are written only by separate preprocessing
+# scripts, which cannot reach this in-process cache, so expiry after the TTL is its only
+# invalidation: results from before an upload are served for at most SEARCH_CACHE_TTL_SECONDS
+SEARCH_CACHE_SIZE = 2000
+SEARCH_CACHE_TTL_SECONDS = 300
+
+
+def _payment_update_data(payment_status: bool, payment_amount: float = None, payment_currency: str = None) -> Dict[str, Any]:
+    """Build the users-table update for a payment status change"""
+    # payment_date is stamped by the set_users_payment_date trigger from the database clock
+    update_data = {'payment_status': payment_status}
+    if payment_amount is not None:
+        update_data['payment_amount'] = payment_amount
+    if payment_currency is not None:
+        update_data['payment_currency'] = payment_currency
+    return update_data
+
 
 class SupabaseClient:
+    # Per-process instance: the bot and the webhook server each get their own when run separately
+    _default = None
+
+    @classmethod
+    def get_default(cls) -> 'SupabaseClient':
+        """Get the shared client configured from Config, creating it on first use"""
+        if cls._default is None:
+            cls._default = cls(Config.SUPABASE_URL, Config.SUPABASE_KEY)
+        return cls._default
+
     def __init__(self, supabase_url: str, supabase_key: str):
         self.client: Client = create_client(supabase_url, supabase_key)
-    
-    async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[User]:
+        self._user_cache = QueryCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+        self._search_cache = QueryCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL_SECONDS)
+
+    def get_cache_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return hit/miss statistics of the user and search caches"""
+        return {
+            'users': self._user_cache.stats(),
+            'search': self._search_cache.stats()
+        }
+
+    async def get_user_by_telegram_id(self, telegram_id: int, use_cache: bool = True) -> Optional[User]:
+        """Get a user, from the cache unless use_cache is False (the fresh row is cached either way)"""
+        if use_cache:
+            user = self._user_cache.get(telegram_id)
+            if user is not None:
+                return user
+
         try:
             # Use asyncio.to_thread to run the synchronous operation in a thread
             response = await asyncio.to_thread(
                 lambda: self.client.table('users').select('*').eq('telegram_id', telegram_id).execute()
             )
             if response.data:
-                return User(**response.data[0])
+                user = User.model_validate(response.data[0])
+                self._user_cache.put(user.telegram_id, user)
+                return user
             return None
         except Exception as e:
-            print(f"Error getting user: {e}")
+            logger.error(f"Error getting user: {e}")
             return None
     
     async def create_or_update_user(self, user_data: Dict[str, Any]) -> Optional[User]:
         try:
-            existing_user = await self.get_user_by_telegram_id(user_data['telegram_id'])
-            
-            if existing_user:
-                response = await asyncio.to_thread(
-                    lambda: self.client.table('users').update(user_data).eq('telegram_id', user_data['telegram_id']).execute()
-                )
-            else:
-                response = await asyncio.to_thread(
-                    lambda: self.client.table('users').insert(user_data).execute()
-                )
-            
+            # Single INSERT ... ON CONFLICT (telegram_id) DO UPDATE round-trip
+            response = await asyncio.to_thread(
+                lambda: self.client.table('users').upsert(user_data, on_conflict='telegram_id').execute()
+            )
+
             if response.data:
-                return User(**response.data[0])
+                user = User.model_validate(response.data[0])
+                self._user_cache.put(user.telegram_id, user)
+                return user
+            self._user_cache.invalidate(user_data['telegram_id'])
             return None
         except Exception as e:
-            print(f"Error creating/updating user: {e}")
+            logger.error(f"Error creating/updating user: {e}")
             return None
     
     async def search_automations_by_similarity(self, query_embedding: List[float], limit: int = 3, threshold: float = None, user_language: str = 'en') -> List[Dict[str, Any]]:
@@ -54,18 +120,21 @@ class SupabaseClient:
         Returns:
             List of automation documents ranked by vector similarity
         """
-        # Get threshold from environment variable if not provided
+        # Fall back to the SIMILARITY_THRESHOLD environment variable if not provided
         if threshold is None:
-            threshold = float(os.getenv('SIMILARITY_THRESHOLD', '0.3'))
+            threshold = DEFAULT_SIMILARITY_THRESHOLD
 
-        try:
-            print(f"🔍 Searching for similar automations with threshold={threshold}, limit={limit}")
+        # Key on a digest of the float32 vector rather than the 3072-float list itself
+        embedding_digest = hashlib.blake2b(array('f', query_embedding).tobytes(), digest_size=16).digest()
+        cache_key = (embedding_digest, limit, threshold, user_language)
+        cached_results = self._search_cache.get(cache_key)
+        if cached_results is not None:
+            return cached_results
 
-            # Use pgvector cosine similarity with proper SQL
-            # Convert similarity threshold to cosine distance (1 - similarity)
-            max_distance = 1.0 - threshold
+        try:
+            logger.debug("🔍 Searching for similar automations with threshold=%s, limit=%s", threshold, limit)
 
-            # Create a PostgreSQL function call or use direct SQL
+            # Ranking and threshold filtering happen in Postgres (see docs/final_schema.sql)
             response = await asyncio.to_thread(
                 lambda: self.client.rpc('search_similar_documents', {
                     'query_embedding': query_embedding,
@@ -75,35 +144,28 @@ class SupabaseClient:
             )
 
             if not response.data:
-                print("🔍 No similar automations found above threshold")
+                logger.debug("🔍 No similar automations found above threshold")
+                self._search_cache.put(cache_key, [])
                 return []
 
-            # Format results with localization
+            # Format results with localization; pick the localized columns once
+            ru = user_language == 'ru'
+            unnamed = _UNNAMED_AUTOMATION['ru' if ru else 'en']
             results = []
             for doc in response.data:
-                # Use localized fields based on user language
-                if user_language == 'ru':
-                    title = doc.get('name_ru') or doc.get('name', 'Unnamed')
-                    short_description = doc.get('short_description_ru') or doc.get('short_description', '')
-                    description = doc.get('description_ru') or doc.get('description', '')
-                else:
-                    title = doc.get('name', 'Unnamed')
-                    short_description = doc.get('short_description', '')
-                    description = doc.get('description', '')
+                name = doc.get('name')
+                short_description = doc.get('short_description', '')
+                if ru:
+                    name = doc.get('name_ru') or name
+                    short_description = doc.get('short_description_ru') or short_description
 
                 # Format title
-                if title and title.endswith('.json'):
-                    title = title[:-5]  # Remove .json extension
-                if title:
-                    title = title.replace('-', ' ').replace('_', ' ').title()
-                else:
-                    title = 'Unnamed Automation' if user_language == 'en' else 'Безымянная автоматизация'
+                title = name.removesuffix('.json').translate(_DASH_UNDERSCORE).title() if name else unnamed
 
                 results.append({
                     'id': doc['id'],
                     'title': title,
                     'short_description': short_description,
-                    'description': description,
                     'url': doc.get('url', ''),
                     'category': doc.get('category', 'Uncategorized'),
                     'subcategory': doc.get('subcategory', ''),
@@ -111,26 +173,31 @@ class SupabaseClient:
                     'similarity': doc.get('similarity', 0.0)
                 })
 
-            print(f"🔍 Found {len(results)} similar automations above threshold {threshold}")
-            for i, doc in enumerate(results):
-                print(f"🔍 Rank {i+1}: {doc['title']} (similarity: {doc.get('similarity', 'N/A')})")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "🔍 Found %d similar automations above threshold %s, top similarities: %s",
+                    len(results), threshold, [round(doc['similarity'], 3) for doc in results]
+                )
 
+            self._search_cache.put(cache_key, results)
             return results
 
         except Exception as e:
-            print(f"Error in pgvector similarity search: {e}")
+            logger.error(f"Error in pgvector similarity search: {e}")
             return []
     
     
     
+    async def get_document_categories(self) -> List[str]:
+        """Return the sorted distinct categories of the documents table"""
+        # DISTINCT runs in Postgres, so one row per category comes back instead of one per document
+        response = await asyncio.to_thread(
+            lambda: self.client.rpc('get_document_categories', {}).execute()
+        )
+        return [row['category'] for row in response.data or []]
+
     async def create_user(self, telegram_id: int, username: str = None, first_name: str = None, last_name: str = None) -> Optional[User]:
         """Create user only if doesn't exist - for handlers compatibility"""
-        # Check if user already exists
-        existing_user = await self.get_user_by_telegram_id(telegram_id)
-        if existing_user:
-            return existing_user  # Don't update, just return existing user
-
-        # Only create new user if doesn't exist
         user_data = {
             'telegram_id': telegram_id,
             'username': username
@@ -139,76 +206,104 @@ class SupabaseClient:
         user_data = {k: v for k, v in user_data.items() if v is not None}
         
         try:
+            # ON CONFLICT DO NOTHING - an existing user is never updated here
             response = await asyncio.to_thread(
-                lambda: self.client.table('users').insert(user_data).execute()
+                lambda: self.client.table('users').upsert(user_data, on_conflict='telegram_id', ignore_duplicates=True).execute()
             )
             if response.data:
-                return response.data[0]
-            return None
+                return User.model_validate(response.data[0])
+            # Nothing returned means the user already existed
+            return await self.get_user_by_telegram_id(telegram_id)
         except Exception as e:
-            print(f"Error creating user: {e}")
+            logger.error(f"Error creating user: {e}")
             return None
     
     async def update_user_payment_status(self, telegram_id: int, payment_status: bool, payment_amount: float = None, payment_currency: str = None) -> bool:
         """Update user payment status"""
         try:
-            from datetime import datetime
-            
-            update_data = {
-                'payment_status': payment_status,
-                'payment_date': datetime.now().isoformat() if payment_status else None
-            }
-            
-            if payment_amount is not None:
-                update_data['payment_amount'] = payment_amount
-            if payment_currency is not None:
-                update_data['payment_currency'] = payment_currency
-            
+            # Single-statement UPDATE in Postgres
             response = await asyncio.to_thread(
-                lambda: self.client.table('users').update(update_data).eq('telegram_id', telegram_id).execute()
+                lambda: self.client.rpc('update_payment', {
+                    'p_telegram_id': telegram_id,
+                    'p_status': payment_status,
+                    'p_amount': payment_amount,
+                    'p_currency': payment_currency
+                }).execute()
             )
+            self._user_cache.invalidate(telegram_id)
             
             if response.data:
-                print(f"✅ Updated payment status for user {telegram_id}: {payment_status}")
+                logger.info(f"✅ Updated payment status for user {telegram_id}: {payment_status}")
                 return True
             else:
-                print(f"❌ Failed to update payment status for user {telegram_id}")
+                logger.warning(f"❌ Failed to update payment status for user {telegram_id}")
                 return False
                 
         except Exception as e:
-            print(f"Error updating payment status: {e}")
+            logger.error(f"Error updating payment status: {e}")
             return False
     
     async def update_user_payment_status_by_email(self, email: str, payment_status: bool, payment_amount: float = None, payment_currency: str = None) -> bool:
         """Update user payment status by email (if email field exists)"""
         try:
-            from datetime import datetime
-            
-            update_data = {
-                'payment_status': payment_status,
-                'payment_date': datetime.now().isoformat() if payment_status else None
-            }
-            
-            if payment_amount is not None:
-                update_data['payment_amount'] = payment_amount
-            if payment_currency is not None:
-                update_data['payment_currency'] = payment_currency
-            
+            update_data = _payment_update_data(payment_status, payment_amount, payment_currency)
+
             # Note: This assumes you have an email field in users table
             # You might need to add email field to users table first
             response = await asyncio.to_thread(
                 lambda: self.client.table('users').update(update_data).eq('email', email).execute()
             )
+            # The cache is keyed by telegram_id, so drop any entry for the updated rows
+            for row in response.data or []:
+                self._user_cache.invalidate(row.get('telegram_id'))
             
             if response.data:
-                print(f"✅ Updated payment status for user with email {email}: {payment_status}")
+                logger.info(f"✅ Updated payment status for user with email {email}: {payment_status}")
                 return True
             else:
-                print(f"❌ Failed to update payment status for user with email {email}")
+                logger.warning(f"❌ Failed to update payment status for user with email {email}")
                 return False
                 
         except Exception as e:
-            print(f"Error updating payment status by email: {e}")
+            logger.error(f"Error updating payment status by email: {e}")
+            return False
+
+    async def update_user_payment_and_subscription(self, telegram_id: int, payment_status: bool, subscription_data: Dict[str, Any], payment_amount: float = None, payment_currency: str = None) -> bool:
+        """Record a payment and the subscription fields it grants in a single UPDATE
+
+        If the payment columns are missing (users table not migrated with docs/final_schema.sql),
+        the subscription fields are still written on their own.
+
+        Returns:
+            True if the user row was updated, False if no such user or on error
+        """
+        try:
+            subscription_update = {k: v for k, v in subscription_data.items() if k != 'telegram_id'}
+            update_data = {**subscription_update, **_payment_update_data(payment_status, payment_amount, payment_currency)}
+
+            try:
+                response = await asyncio.to_thread(
+                    lambda: self.client.table('users').update(update_data).eq('telegram_id', telegram_id).execute()
+                )
+            except APIError as e:
+                # Only an unmigrated users table falls back; any other failure is reported as such
+                if e.code not in _MISSING_COLUMN_CODES:
+                    raise
+                logger.warning(f"Payment columns missing for user {telegram_id} ({e.message}), updating subscription only")
+                response = await asyncio.to_thread(
+                    lambda: self.client.table('users').update(subscription_update).eq('telegram_id', telegram_id).execute()
+                )
+            self._user_cache.invalidate(telegram_id)
+
+            if response.data:
+                logger.info(f"✅ Updated payment and subscription for user {telegram_id}: {payment_status}")
+                return True
+            else:
+                logger.warning(f"❌ Failed to update payment and subscription for user {telegram_id}")
+                return False
+
+        except Exception as e:
+            logger.error(f"Error updating payment and subscription: {e}")
             return False
 
     async def update_user_subscription(self, subscription_data: Dict[str, Any]) -> bool:
@@ -224,20 +319,21 @@ class SupabaseClient:
         try:
             telegram_id = subscription_data.get('telegram_id')
             if not telegram_id:
-                print("Error: telegram_id is required for subscription update")
+                logger.error("telegram_id is required for subscription update")
                 return False
 
             response = await asyncio.to_thread(
                 lambda: self.client.table('users').update(subscription_data).eq('telegram_id', telegram_id).execute()
             )
+            self._user_cache.invalidate(telegram_id)
 
             if response.data:
-                print(f"✅ Updated subscription for user {telegram_id}: {subscription_data.get('subscription_status', 'unknown')}")
+                logger.info(f"✅ Updated subscription for user {telegram_id}: {subscription_data.get('subscription_status', 'unknown')}")
                 return True
             else:
-                print(f"❌ Failed to update subscription for user {telegram_id}")
+                logger.warning(f"❌ Failed to update subscription for user {telegram_id}")
                 return False
 
         except Exception as e:
-            print(f"Error updating user subscription: {e}")
+            logger.error(f"Error updating user subscription: {e}")
             return False
\ No newline at end of file
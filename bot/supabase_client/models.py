@@ -1,8 +1,12 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 
 class User(BaseModel):
+    # Instances are shared through the client's user cache, so they must not be mutated;
+    # the users row carries more columns (payment, subscription) than the bot reads
+    model_config = ConfigDict(frozen=True, extra='ignore')
+
     id: Optional[int] = None
     telegram_id: int
     username: Optional[str] = None
@@ -30,7 +30,7 @@ CREATE TABLE IF NOT EXISTS documents (
     description_ru TEXT,
     tags TEXT[],
     stack TEXT[],
-    embedding VECTOR(3072),
+    embedding HALFVEC(3072),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
@@ -51,10 +51,21 @@ CREATE TABLE IF NOT EXISTS user_messages (
 CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id);
 CREATE INDEX IF NOT EXISTS idx_documents_category_id ON documents(category);
 CREATE INDEX IF NOT EXISTS idx_documents_subdirectory_id ON documents(subcategory);
+CREATE INDEX IF NOT EXISTS idx_documents_url ON documents(url);
 CREATE INDEX IF NOT EXISTS idx_documents_tags ON documents USING gin(tags);
 CREATE INDEX IF NOT EXISTS idx_documents_stack ON documents USING gin(stack);
--- CREATE INDEX IF NOT EXISTS idx_documents_embedding ON documents USING hnsw (embedding vector_cosine_ops);
--- Note: pgvector indexes are limited to 2000 dimensions, text-embedding-3-large uses 3072
+-- Embeddings are stored as half precision (pgvector >= 0.7): 6KB per row instead of 12KB, with no
+-- measurable effect on retrieval ranking. Existing databases migrate with
+--   ALTER TABLE documents ALTER COLUMN embedding TYPE halfvec(3072) USING embedding::halfvec(3072);
+-- (drop and recreate idx_documents_embedding_bits around it).
+-- The HNSW index is built on the binary-quantized embedding (1 bit per dimension), which keeps it far
+-- smaller than a halfvec index. It only has to produce candidates; search_similar_documents re-ranks
+-- them on the stored halfvec embeddings.
+CREATE INDEX IF NOT EXISTS idx_documents_embedding_bits ON documents USING hnsw ((binary_quantize(embedding)::bit(3072)) bit_hamming_ops);
+-- Documents still waiting for an embedding, matching the keyset scan in
+-- preprocessing/embeddings/generate_embeddings.py; it shrinks to nothing once every row is embedded
+CREATE INDEX IF NOT EXISTS idx_documents_needs_embedding ON documents(id)
+    WHERE embedding IS NULL AND description IS NOT NULL AND description <> '';
 
 -- Triggers for updated_at timestamps
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -68,6 +79,149 @@ $$ language 'plpgsql';
 CREATE TRIGGER update_users_updated_at BEFORE INSERT OR UPDATE ON users FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_documents_updated_at BEFORE INSERT OR UPDATE ON documents FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Similarity search used by the bot (SupabaseClient.search_automations_by_similarity)
+-- Ranking happens in Postgres so only the top matches are sent back, never the embeddings
+-- or full descriptions (the detail view fetches those by id).
+-- Two stages: the Hamming-distance HNSW index picks candidates from 1 bit per dimension,
+-- then only those candidates are re-ranked exactly.
+-- An HNSW scan returns at most hnsw.ef_search rows (default 40), so the function raises it to
+-- the candidate count; otherwise stage 1 would silently hand over 40 candidates, not 500.
+-- OpenAI embeddings are unit length, so cosine similarity equals the inner product;
+-- <#> returns the negative inner product and skips the per-row norm computation of <=>
+-- CREATE OR REPLACE cannot change the parameter types or result columns, and a new parameter
+-- type would add an ambiguous overload (PGRST203), so earlier versions are dropped first
+DROP FUNCTION IF EXISTS search_similar_documents(vector, float, int);
+DROP FUNCTION IF EXISTS search_similar_documents(halfvec, float, int);
+CREATE OR REPLACE FUNCTION search_similar_documents(
+    query_embedding HALFVEC(3072),
+    similarity_threshold FLOAT DEFAULT 0.3,
+    result_limit INT DEFAULT 3
+)
+RETURNS TABLE (
+    id INT,
+    name VARCHAR,
+    name_ru VARCHAR,
+    short_description TEXT,
+    short_description_ru TEXT,
+    url VARCHAR,
+    category VARCHAR,
+    subcategory VARCHAR,
+    tags TEXT[],
+    similarity FLOAT
+) AS $$
+    WITH candidates AS (
+        SELECT d.id
+        FROM documents d
+        WHERE d.embedding IS NOT NULL
+        ORDER BY binary_quantize(d.embedding)::bit(3072) <~> binary_quantize(query_embedding)
+        LIMIT 500
+    )
+    SELECT
+        d.id,
+        d.name,
+        d.name_ru,
+        d.short_description,
+        d.short_description_ru,
+        d.url,
+        d.category,
+        d.subcategory,
+        d.tags,
+        -(d.embedding <#> query_embedding) AS similarity
+    FROM candidates c
+    JOIN documents d ON d.id = c.id
+    WHERE -(d.embedding <#> query_embedding) > similarity_threshold
+    ORDER BY d.embedding <#> query_embedding
+    LIMIT result_limit;
+$$ LANGUAGE sql STABLE
+SET hnsw.ef_search = 500;
+
+-- Bulk embedding write used by preprocessing/embeddings/generate_embeddings.py:
+-- rows is a JSON array of {"id": ..., "embedding": [...]}, applied as one UPDATE
+CREATE OR REPLACE FUNCTION update_document_embeddings(rows JSONB)
+RETURNS INT AS $$
+    WITH updated AS (
+        UPDATE documents d
+        SET embedding = (r->>'embedding')::halfvec
+        FROM jsonb_array_elements(rows) r
+        WHERE d.id = (r->>'id')::int
+        RETURNING d.id
+    )
+    SELECT COUNT(*)::int FROM updated;
+$$ LANGUAGE sql;
+
+-- Bulk write of extracted workflow fields used by preprocessing/summary_agent/agent.py:
+-- rows is a JSON array of objects keyed by url, applied as one UPDATE; returns the urls that matched
+CREATE OR REPLACE FUNCTION update_documents_by_url(rows JSONB)
+RETURNS TABLE (url VARCHAR) AS $$
+    UPDATE documents d
+    SET name_ru = r.name_ru,
+        short_description = r.short_description,
+        short_description_ru = r.short_description_ru,
+        description = r.description,
+        description_ru = r.description_ru,
+        tags = r.tags,
+        stack = r.stack
+    FROM jsonb_to_recordset(rows) AS r(
+        url TEXT,
+        name_ru TEXT,
+        short_description TEXT,
+        short_description_ru TEXT,
+        description TEXT,
+        description_ru TEXT,
+        tags TEXT[],
+        stack TEXT[]
+    )
+    WHERE d.url = r.url
+    RETURNING d.url;
+$$ LANGUAGE sql;
+
+-- Distinct marketplace categories (SupabaseClient.get_document_categories), deduplicated in Postgres
+CREATE OR REPLACE FUNCTION get_document_categories()
+RETURNS TABLE (category VARCHAR) AS $$
+    SELECT DISTINCT d.category
+    FROM documents d
+    WHERE d.category IS NOT NULL AND d.category <> ''
+    ORDER BY d.category;
+$$ LANGUAGE sql STABLE;
+
+-- Payment fields written by the Stripe webhook (SupabaseClient.update_user_payment_status*)
+ALTER TABLE users ADD COLUMN IF NOT EXISTS email VARCHAR(255);
+ALTER TABLE users ADD COLUMN IF NOT EXISTS payment_status BOOLEAN DEFAULT FALSE;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS payment_date TIMESTAMP WITH TIME ZONE;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS payment_amount NUMERIC;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS payment_currency VARCHAR(10);
+
+-- payment_date is stamped from the database clock whenever payment_status is written,
+-- so clients never send their own timestamp
+CREATE OR REPLACE FUNCTION set_payment_date()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.payment_date = CASE WHEN NEW.payment_status THEN NOW() ELSE NULL END;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER set_users_payment_date BEFORE UPDATE OF payment_status ON users FOR EACH ROW EXECUTE FUNCTION set_payment_date();
+
+-- Payment status update in one statement (payment_date is set by the trigger above)
+CREATE OR REPLACE FUNCTION update_payment(
+    p_telegram_id BIGINT,
+    p_status BOOLEAN,
+    p_amount NUMERIC DEFAULT NULL,
+    p_currency TEXT DEFAULT NULL
+)
+RETURNS BOOLEAN AS $$
+    WITH updated AS (
+        UPDATE users
+        SET payment_status = p_status,
+            payment_amount = COALESCE(p_amount, payment_amount),
+            payment_currency = COALESCE(p_currency, payment_currency)
+        WHERE telegram_id = p_telegram_id
+        RETURNING 1
+    )
+    SELECT COUNT(*) > 0 FROM updated;
+$$ LANGUAGE sql;
+
 -- Enable RLS
 ALTER TABLE users ENABLE ROW LEVEL SECURITY;
 ALTER TABLE documents ENABLE ROW LEVEL SECURITY;
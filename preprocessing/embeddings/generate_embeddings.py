@@ -9,15 +9,23 @@ where description is not null but embedding is null.
 import os
 import sys
 import asyncio
+import hashlib
+import json
 import logging
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
+import sqlite3
+import time
+from array import array
+from collections import deque
+import tiktoken
+from typing import List, Dict, Any, Optional, AsyncIterator
+from openai import AsyncOpenAI, BadRequestError, RateLimitError
 from dotenv import load_dotenv
 
 # Add parent directories to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 from bot.config import Config
 from bot.supabase_client.client import SupabaseClient
+from preprocessing.rate_limit import RateLimiter
 
 # Load environment variables
 load_dotenv()
@@ -26,6 +34,97 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Per-model limits, resolved once when the generator is created. Only models producing
+# vectors of the size of documents.embedding (3072, see docs/final_schema.sql) belong here
+MODEL_SPECS = {
+    'text-embedding-3-large': {'dimensions': 3072, 'max_tokens': 8191, 'batch_size': 96},
+}
+
+def _fetch_documents_page(client, last_id: int, page_size: int):
+    """Fetch the next page of documents that still need an embedding (runs in a worker thread)"""
+    return client.table('documents')\
+        .select('id, name, description')\
+        .is_('embedding', 'null')\
+        .not_.is_('description', 'null')\
+        .neq('description', '')\
+        .gt('id', last_id)\
+        .order('id')\
+        .limit(page_size)\
+        .execute()
+
+def _update_embeddings_rpc(client, payload: List[Dict[str, Any]]):
+    """Store embeddings with the update_document_embeddings RPC (runs in a worker thread)"""
+    return client.rpc('update_document_embeddings', {'rows': payload}).execute()
+
+class AdmissionController:
+    """Limits concurrent OpenAI requests to a limit that adapts to rate limiting
+
+    The limit halves whenever a request is still rate limited after the SDK's own
+    retries, and grows back by one after a run of successful requests.
+    """
+
+    def __init__(self, max_concurrency: int, grow_after: int = 20):
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.grow_after = grow_after
+        self.active = 0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self._condition:
+            self.active -= 1
+            if exc_type is RateLimitError:
+                self._successes = 0
+                self.limit = max(1, self.limit // 2)
+                logger.warning(f"Rate limited, reducing concurrent requests to {self.limit}")
+            elif exc_type is None:
+                self._successes += 1
+                if self._successes >= self.grow_after and self.limit < self.max_concurrency:
+                    self._successes = 0
+                    self.limit += 1
+                    logger.info(f"Increasing concurrent requests to {self.limit}")
+            self._condition.notify_all()
+
+class EmbeddingCache:
+    """On-disk cache of embeddings keyed by (model, sha256 of the text)
+
+    Vectors are stored as float32 bytes, the precision the API returns (documents.embedding
+    keeps them as halfvec), so re-runs never pay for a text that was already embedded.
+    """
+
+    def __init__(self, path: str):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, text_hash BLOB NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, text_hash))"
+        )
+
+    @staticmethod
+    def text_hash(text: str) -> bytes:
+        return hashlib.sha256(text.encode('utf-8')).digest()
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        row = self.connection.execute(
+            "SELECT vector FROM embeddings WHERE model = ? AND text_hash = ?",
+            (model, self.text_hash(text))
+        ).fetchone()
+        return array('f', row[0]).tolist() if row else None
+
+    def set_many(self, model: str, items: List[tuple]):
+        """Store (text, embedding) pairs in one transaction"""
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                [(model, self.text_hash(text), array('f', embedding).tobytes()) for text, embedding in items]
+            )
+
 class EmbeddingGenerator:
     """Generator for creating embeddings for documents"""
 
@@ -47,204 +146,297 @@ class EmbeddingGenerator:
         if not all([self.supabase_url, self.supabase_key, self.openai_key]):
             raise ValueError("Missing required environment variables: SUPABASE_URL, SUPABASE_KEY, OPENAI_API_KEY")
 
+        self.model_spec = MODEL_SPECS.get(self.embedding_model)
+        if self.model_spec is None:
+            # Fail before spending on requests whose vectors the documents table would reject
+            raise ValueError(f"Unsupported embedding model {self.embedding_model}, expected one of: {', '.join(MODEL_SPECS)}")
+        self.max_tokens = self.model_spec['max_tokens']
+
         # Initialize clients
         self.supabase_client = SupabaseClient(self.supabase_url, self.supabase_key)
-        self.openai_client = OpenAI(api_key=self.openai_key)
+        # The SDK retries 429/5xx/connection errors with exponential backoff and honours
+        # Retry-After; allow more attempts than its default of 2 for long runs
+        self.openai_client = AsyncOpenAI(
+            api_key=self.openai_key,
+            max_retries=int(os.getenv('OPENAI_MAX_RETRIES', '6'))
+        )
+
+        self.rate_limiter = RateLimiter(
+            requests_per_minute=int(os.getenv('OPENAI_RPM_LIMIT', '3000')),
+            tokens_per_minute=int(os.getenv('OPENAI_TPM_LIMIT', '1000000'))
+        )
+        self.admission = AdmissionController(int(os.getenv('EMBEDDING_MAX_CONCURRENCY', '5')))
+        self.cache = EmbeddingCache(os.getenv('EMBEDDING_CACHE_PATH', '.embed_cache.sqlite3'))
+
+        try:
+            self.encoding = tiktoken.encoding_for_model(self.embedding_model)
+        except KeyError:
+            # Unknown model name: all current embedding models use cl100k_base
+            self.encoding = tiktoken.get_encoding('cl100k_base')
+        self.truncated_count = 0
+
+        self.checkpoint_path = os.getenv('EMBEDDING_CHECKPOINT_PATH', 'embed_checkpoint.json')
 
         # Initialize failed documents list
         self.failed_documents = []
 
         logger.info(f"Initialized Embedding Generator with model: {self.embedding_model}")
 
-    async def get_documents_without_embeddings(self) -> List[Dict[str, Any]]:
-        """Get all documents where description is not null but embedding is null"""
+    def load_checkpoint(self) -> int:
+        """Return the id an interrupted run got through, or 0 to scan from the start"""
         try:
-            all_documents = []
-            page_size = 1000
-            start = 0
-
-            logger.info("Fetching all documents without embeddings using pagination...")
-
-            while True:
-                end = start + page_size - 1
-                logger.info(f"Fetching documents {start} to {end}...")
-
-                response = await asyncio.to_thread(
-                    lambda: self.supabase_client.client.table('documents')\
-                        .select('id, name, description')\
-                        .is_('embedding', 'null')\
-                        .not_.is_('description', 'null')\
-                        .neq('description', '')\
-                        .range(start, end)\
-                        .execute()
-                )
-
-                documents = response.data if response.data else []
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable checkpoint {self.checkpoint_path}: {e}")
+            return 0
+
+        # Vectors from another model are not comparable, so its progress doesn't count
+        if checkpoint.get('model') != self.embedding_model:
+            logger.info(f"Checkpoint is for model {checkpoint.get('model')}, starting from the beginning")
+            return 0
+        return checkpoint.get('last_id', 0)
+
+    def save_checkpoint(self, last_id: int):
+        """Atomically record that every document up to last_id has been handled"""
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'model': self.embedding_model, 'last_id': last_id, 'saved_at': time.time()}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def clear_checkpoint(self):
+        """Forget the checkpoint after a complete scan, so the next run retries failed documents"""
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    async def iter_documents_without_embeddings(self, page_size: int = 1000, start_id: int = 0) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield pages of documents where description is not null but embedding is null
+
+        Pages are keyed on id (id > last seen) rather than offsets, so documents that get
+        their embedding while the scan is still running don't shift the following pages.
+        """
+        last_id = start_id
+        while True:
+            logger.info(f"Fetching documents after id {last_id}...")
 
-                if not documents:
-                    logger.info("No more documents found, pagination complete")
-                    break
+            response = await asyncio.to_thread(
+                _fetch_documents_page, self.supabase_client.client, last_id, page_size
+            )
 
-                all_documents.extend(documents)
-                logger.info(f"Fetched {len(documents)} documents (total so far: {len(all_documents)})")
+            documents = response.data if response.data else []
+            if not documents:
+                logger.info("No more documents found, pagination complete")
+                return
 
-                # If we got fewer documents than page_size, we've reached the end
-                if len(documents) < page_size:
-                    logger.info("Reached end of documents (partial page)")
-                    break
+            yield documents
 
-                start += page_size
+            # If we got fewer documents than page_size, we've reached the end
+            if len(documents) < page_size:
+                logger.info("Reached end of documents (partial page)")
+                return
 
-            logger.info(f"Found {len(all_documents)} total documents without embeddings")
-            return all_documents
-
-        except Exception as e:
-            logger.error(f"Error fetching documents: {e}")
-            return []
+            last_id = documents[-1]['id']
 
     async def generate_embedding(self, text: str) -> Optional[List[float]]:
-        """Generate embedding for text using OpenAI API"""
+        """Generate embedding for a single text, going through the on-disk cache like a batch"""
         try:
-            response = await asyncio.to_thread(
-                lambda: self.openai_client.embeddings.create(
-                    model=self.embedding_model,
-                    input=text
-                )
-            )
-            return response.data[0].embedding
+            return (await self.generate_embeddings_batch([text]))[0]
         except Exception as e:
             logger.error(f"Error generating embedding: {e}")
             return None
 
-    async def update_document_embedding(self, doc_id: int, embedding: List[float]) -> bool:
-        """Update document with generated embedding"""
+    async def update_documents_embeddings(self, rows: List[tuple]) -> int:
+        """Store (document, embedding) pairs with a single bulk UPDATE, returning the rows updated
+
+        Uses the update_document_embeddings RPC: a plain upsert on id would have to
+        satisfy the NOT NULL columns of a would-be insert.
+        """
         try:
-            response = await asyncio.to_thread(
-                lambda: self.supabase_client.client.table('documents')\
-                    .update({'embedding': embedding})\
-                    .eq('id', doc_id)\
-                    .execute()
-            )
+            payload = [{'id': document['id'], 'embedding': embedding} for document, embedding in rows]
+            response = await asyncio.to_thread(_update_embeddings_rpc, self.supabase_client.client, payload)
 
-            if response.data:
-                logger.info(f"Successfully updated embedding for document ID: {doc_id}")
-                return True
+            updated = response.data or 0
+            if updated != len(rows):
+                logger.warning(f"Updated {updated} of {len(rows)} documents")
             else:
-                logger.warning(f"No document updated for ID: {doc_id}")
-                return False
+                logger.info(f"Successfully updated embeddings for {updated} documents")
+            return updated
 
         except Exception as e:
-            logger.error(f"Error updating document {doc_id}: {e}")
-            return False
-
-    async def process_document(self, document: Dict[str, Any]) -> bool:
-        """Process a single document to generate and store embedding"""
-        doc_id = document['id']
-        name = document['name']
-        description = document['description']
+            logger.error(f"Error updating {len(rows)} documents: {e}")
+            return 0
+
+    def truncate_text(self, text: str) -> str:
+        """Cut text to the model's input token limit so one long description can't fail a batch"""
+        tokens = self.encoding.encode(text, disallowed_special=())
+        if len(tokens) <= self.max_tokens:
+            return text
+        self.truncated_count += 1
+        return self.encoding.decode(tokens[:self.max_tokens])
+
+    async def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+        """Generate embeddings for several texts with a single OpenAI request
+
+        Texts already in the on-disk cache are served from it and not sent to the API.
+        """
+        embeddings = [self.cache.get(self.embedding_model, text) for text in texts]
+        misses = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if not misses:
+            return embeddings
+
+        miss_texts = [texts[i] for i in misses]
+        async with self.admission:
+            await self.rate_limiter.acquire(RateLimiter.estimate_tokens(miss_texts))
+            response = await self.openai_client.embeddings.create(
+                model=self.embedding_model,
+                input=miss_texts
+            )
+        # Embeddings come back in the same order as the inputs
+        for i, item in zip(misses, response.data):
+            embeddings[i] = item.embedding
+        self.cache.set_many(self.embedding_model, [(texts[i], embeddings[i]) for i in misses])
+        return embeddings
+
+    def record_failure(self, document: Dict[str, Any], error: str):
+        """Remember a failed document for the report"""
+        logger.error(f"Failed document {document['id']}: {document['name']} ({error})")
+        self.failed_documents.append({
+            'id': document['id'],
+            'name': document['name'],
+            'error': error
+        })
+
+    async def process_batch(self, batch: List[List[Dict[str, Any]]]) -> int:
+        """Embed a batch of documents with one API call and store the results
+
+        Each batch item is a group of documents sharing the same description;
+        the text is embedded once and the vector stored for every document in the group.
+
+        Returns:
+            Number of documents whose embedding was stored
+        """
+        texts = [self.truncate_text(group[0]['description']) for group in batch]
 
         try:
-            logger.info(f"Processing document {doc_id}: {name[:50]}...")
-
-            # Generate embedding for the description
-            embedding = await self.generate_embedding(description)
-
-            if embedding is None:
-                error_msg = f"Failed to generate embedding for document {doc_id}: {name}"
-                logger.error(error_msg)
-                self.failed_documents.append({
-                    'id': doc_id,
-                    'name': name,
-                    'error': 'Embedding generation failed'
-                })
-                return False
-
-            # Update document with embedding
-            success = await self.update_document_embedding(doc_id, embedding)
-
-            if not success:
-                error_msg = f"Failed to update document {doc_id} in database: {name}"
-                logger.error(error_msg)
-                self.failed_documents.append({
-                    'id': doc_id,
-                    'name': name,
-                    'error': 'Database update failed'
-                })
-
-            return success
-
+            embeddings = await self.generate_embeddings_batch(texts)
+        except BadRequestError as e:
+            # Inputs are already token-bounded; retry one by one so the rest still succeed
+            logger.warning(f"Batch request rejected ({e}), falling back to per-document requests")
+            embeddings = [await self.generate_embedding(text) for text in texts]
         except Exception as e:
-            error_msg = f"Exception processing document {doc_id}: {e}"
-            logger.error(error_msg)
-            self.failed_documents.append({
-                'id': doc_id,
-                'name': name,
-                'error': str(e)
-            })
-            return False
-
-    async def generate_all_embeddings(self, batch_size: int = 10):
-        """Generate embeddings for all documents that need them"""
+            logger.error(f"Error generating batch embeddings: {e}")
+            embeddings = [None] * len(batch)
+
+        rows = []
+        for group, embedding in zip(batch, embeddings):
+            for document in group:
+                if embedding is None:
+                    self.record_failure(document, 'Embedding generation failed')
+                else:
+                    rows.append((document, embedding))
+
+        if not rows:
+            return 0
+
+        stored = await self.update_documents_embeddings(rows)
+        if not stored:
+            for document, _ in rows:
+                self.record_failure(document, 'Database update failed')
+        return stored
+
+    async def generate_all_embeddings(self, batch_size: int = None, max_in_flight: int = 5):
+        """Generate embeddings for all documents that need them
+
+        Documents are streamed page by page and batches start as soon as they are formed;
+        at most max_in_flight batches (and the page being split) are held in memory.
+        batch_size defaults to the model's recommended batch size.
+        """
         logger.info("Starting embedding generation process")
+        batch_size = batch_size or self.model_spec['batch_size']
 
         try:
-            # Get documents without embeddings
-            documents = await self.get_documents_without_embeddings()
+            # Overlap request latency across batches; the semaphore bounds batches held in memory,
+            # self.admission bounds the requests actually sent
+            semaphore = asyncio.Semaphore(max_in_flight)
+            # Only unfinished tasks are kept; results are tallied as each batch completes
+            pending = set()
+            batch_count = 0
+            processed = 0
+            successful = 0
 
-            if not documents:
+            # Pages in scan order with their unfinished batch counts; the checkpoint only
+            # advances past a page once it and every page before it are done
+            pages = deque()
+            start_id = self.load_checkpoint()
+            if start_id:
+                logger.info(f"Resuming after document id {start_id} from {self.checkpoint_path}")
+
+            async def run_batch(number: int, batch: List[List[Dict[str, Any]]], page: Dict[str, int]):
+                nonlocal successful
+                try:
+                    logger.info(f"Processing batch {number}")
+                    successful += await self.process_batch(batch)
+                except Exception as e:
+                    logger.error(f"Processing error in batch {number}: {e}")
+                finally:
+                    semaphore.release()
+                    page['remaining'] -= 1
+                    last_done = None
+                    while pages and pages[0]['remaining'] == 0:
+                        last_done = pages.popleft()['last_id']
+                    if last_done is not None:
+                        self.save_checkpoint(last_done)
+
+            async for documents in self.iter_documents_without_embeddings(start_id=start_id):
+                processed += len(documents)
+
+                # Identical descriptions are embedded once and the vector reused for every document
+                # (repeats across pages are served by the on-disk cache)
+                groups: Dict[str, List[Dict[str, Any]]] = {}
+                for document in documents:
+                    groups.setdefault(document['description'], []).append(document)
+                unique_groups = list(groups.values())
+                logger.info(f"{len(documents)} documents have {len(unique_groups)} unique descriptions")
+
+                page = {'last_id': documents[-1]['id'], 'remaining': -(-len(unique_groups) // batch_size)}
+                pages.append(page)
+                for i in range(0, len(unique_groups), batch_size):
+                    await semaphore.acquire()
+                    batch_count += 1
+                    task = asyncio.create_task(run_batch(batch_count, unique_groups[i:i + batch_size], page))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+
+            if not batch_count:
                 logger.info("No documents found that need embeddings")
+                self.clear_checkpoint()
                 return
 
-            total_docs = len(documents)
-            processed = 0
-            successful = 0
-            failed = 0
-
-            # Process documents in batches
-            for i in range(0, total_docs, batch_size):
-                batch = documents[i:i + batch_size]
-                logger.info(f"Processing batch {i//batch_size + 1}/{(total_docs + batch_size - 1)//batch_size}")
-
-                # Process batch
-                tasks = []
-                for document in batch:
-                    tasks.append(self.process_document(document))
-
-                # Wait for batch to complete
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-
-                # Count results
-                for result in results:
-                    processed += 1
-                    if result is True:
-                        successful += 1
-                    else:
-                        failed += 1
-                        if isinstance(result, Exception):
-                            logger.error(f"Processing error: {result}")
-
-                # Small delay between batches to avoid rate limits
-                await asyncio.sleep(1)
+            await asyncio.gather(*pending)
+            failed = processed - successful
+
+            self.clear_checkpoint()
 
             logger.info(f"Embedding generation completed!")
             logger.info(f"Total processed: {processed}")
             logger.info(f"Successful: {successful}")
             logger.info(f"Failed: {failed}")
+            if self.truncated_count:
+                logger.info(f"Truncated to {self.max_tokens} tokens: {self.truncated_count}")
 
-            # Save failed documents to file
+            # Save failed documents as JSON Lines (one document per line) for re-processing
             if self.failed_documents:
                 from datetime import datetime
-                failed_file_path = "failed_embeddings.txt"
+                failed_file_path = "failed_embeddings.jsonl"
                 with open(failed_file_path, 'w', encoding='utf-8') as f:
-                    f.write(f"Failed Embedding Generation Report\n")
-                    f.write(f"Total failed: {len(self.failed_documents)}\n")
-                    f.write(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-
-                    for doc in self.failed_documents:
-                        f.write(f"ID: {doc['id']}\n")
-                        f.write(f"Name: {doc['name']}\n")
-                        f.write(f"Error: {doc['error']}\n")
-                        f.write("-" * 50 + "\n")
+                    f.write("\n".join(json.dumps(doc, ensure_ascii=False) for doc in self.failed_documents) + "\n")
+                with open("failed_embeddings.meta.json", 'w', encoding='utf-8') as f:
+                    json.dump({
+                        'total_failed': len(self.failed_documents),
+                        'generated_on': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    }, f)
 
                 logger.info(f"Saved {len(self.failed_documents)} failed document details to {failed_file_path}")
 
@@ -256,7 +448,9 @@ async def main():
     """Main entry point"""
     try:
         generator = EmbeddingGenerator()
-        await generator.generate_all_embeddings()
+        await generator.generate_all_embeddings(
+            max_in_flight=int(os.getenv('EMBEDDING_MAX_CONCURRENCY', '5'))
+        )
         logger.info("Embedding generation completed successfully!")
 
     except Exception as e:
@@ -0,0 +1,53 @@
+"""Request pacing shared by the preprocessing scripts"""
+
+import asyncio
+import time
+from typing import List
+
+
+class RateLimiter:
+    """Paces OpenAI requests against per-minute request and token limits
+
+    Two continuously refilled token buckets: one request slot per call and an
+    estimated token count per input text.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._request_allowance = float(requests_per_minute)
+        self._token_allowance = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def estimate_tokens(texts: List[str]) -> int:
+        """Rough token estimate (~4 characters per token)"""
+        return sum(len(text) // 4 + 1 for text in texts)
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._request_allowance = min(
+            self.requests_per_minute, self._request_allowance + elapsed * self.requests_per_minute / 60
+        )
+        self._token_allowance = min(
+            self.tokens_per_minute, self._token_allowance + elapsed * self.tokens_per_minute / 60
+        )
+
+    async def acquire(self, tokens: int):
+        """Wait until one request carrying the given number of tokens fits both limits"""
+        # A request bigger than the whole bucket could otherwise never be admitted
+        tokens = min(tokens, self.tokens_per_minute)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._request_allowance >= 1 and self._token_allowance >= tokens:
+                    self._request_allowance -= 1
+                    self._token_allowance -= tokens
+                    return
+                await asyncio.sleep(max(
+                    (1 - self._request_allowance) * 60 / self.requests_per_minute,
+                    (tokens - self._token_allowance) * 60 / self.tokens_per_minute
+                ))
@@ -7,18 +7,24 @@ and updates the documents table in Supabase with short_description, description,
 """
 
 import os
+import hashlib
 import json
 import logging
 import asyncio
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from types import MappingProxyType
 from typing import List, Dict, Any, Optional
-from openai import OpenAI
+import httpx
+import tiktoken
+from openai import AsyncOpenAI
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
 # Add parent directories to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+from preprocessing.rate_limit import RateLimiter
 
 # Load environment variables
 load_dotenv()
@@ -27,6 +33,76 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# OpenAI extractions in flight at once
+MAX_CONCURRENT_FILES = int(os.getenv('SUMMARY_AGENT_CONCURRENCY', '5'))
+
+# Extracted rows written per update_documents_by_url call
+UPDATE_BATCH_SIZE = 50
+
+# Extracted fields written to the documents table
+DOCUMENT_FIELDS = (
+    'name_ru', 'short_description', 'short_description_ru',
+    'description', 'description_ru', 'tags', 'stack'
+)
+
+# NOT NULL columns of documents; a row missing one would fail the whole bulk UPDATE
+REQUIRED_FIELDS = ('short_description', 'description')
+
+# Completion budget per extraction, also reserved against the tokens-per-minute limit
+MAX_COMPLETION_TOKENS = 2000
+
+# Bump when the extraction prompt changes so cached results from the old prompt are not reused
+PROMPT_VERSION = 'v2'
+
+# Extraction result shape; fills in any field missing from a model response
+EMPTY_EXTRACTION = MappingProxyType({
+    "name": None,
+    "name_ru": None,
+    "short_description": None,
+    "short_description_ru": None,
+    "description": None,
+    "description_ru": None,
+    "tags": (),
+    "stack": ()
+})
+
+# Longest markdown sent per workflow; the rest of the page is dropped
+MAX_MARKDOWN_TOKENS = 6000
+
+SYSTEM_MESSAGE = """You extract structured data from n8n workflow template pages (markdown) and reply with JSON only.
+Rules:
+- name: exact workflow title; name_ru: its Russian translation
+- short_description: 2-3 words, no punctuation, describing the main function; short_description_ru: Russian translation
+- description: what the workflow does and how it works, max 3000 chars; description_ru: Russian translation
+- tags: names from the "Categories" section only, lowercase, no special characters; [] if there is none
+- stack: every node, service, API and tool mentioned, lowercase, 1-2 words each, sorted alphabetically"""
+
+USER_MESSAGE_TEMPLATE = """{markdown_content}
+
+Return a JSON object with exactly these keys:
+{{"name": string|null, "name_ru": string|null, "short_description": string|null, "short_description_ru": string|null, "description": string|null, "description_ru": string|null, "tags": [string], "stack": [string]}}
+
+Example: a Fastmail webhook workflow has tags ["personal productivity"] and stack ["fastmail", "html", "http request", "switch", "webhook"]."""
+
+# Worker threads reading workflow files; the reads are I/O bound
+LOAD_WORKERS = 16
+
+def _read_workflow_file(path: Path):
+    """Read and parse one workflow file, returning (path, data, error)"""
+    try:
+        with open(path, 'rb') as f:
+            return path, json.loads(f.read()), None
+    except Exception as e:
+        return path, None, e
+
+def _normalize_terms(terms: Optional[List[str]]) -> List[str]:
+    """Lowercase, strip, deduplicate and sort tag/stack terms, dropping empty ones"""
+    return sorted({term for term in (t.strip().lower() for t in terms or () if t) if term})
+
+def _missing_required_fields(extracted_data: Dict[str, Any]) -> List[str]:
+    """Return the REQUIRED_FIELDS that are empty in an extraction result"""
+    return [field for field in REQUIRED_FIELDS if not extracted_data.get(field)]
+
 class N8NSummaryAgent:
     """Agent for processing N8N workflow files and updating documents table"""
 
@@ -50,13 +126,47 @@ class N8NSummaryAgent:
 
         # Initialize clients
         self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
-        self.openai_client = OpenAI(api_key=self.openai_key)
+        # One pooled keep-alive client for every OpenAI request; sized above the file concurrency
+        self._http = httpx.AsyncClient(
+            timeout=httpx.Timeout(60.0, connect=10.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=MAX_CONCURRENT_FILES)
+        )
+        # The SDK retries 429/timeout/5xx/connection errors with exponential backoff and honours
+        # Retry-After; anything still failing after that is reported and the file skipped
+        self.openai_client = AsyncOpenAI(
+            api_key=self.openai_key,
+            http_client=self._http,
+            max_retries=int(os.getenv('OPENAI_MAX_RETRIES', '6'))
+        )
+
+        # Requests wait for RPM/TPM capacity up front instead of bursting into 429s
+        self.rate_limiter = RateLimiter(
+            requests_per_minute=int(os.getenv('OPENAI_CHAT_RPM_LIMIT', '500')),
+            tokens_per_minute=int(os.getenv('OPENAI_CHAT_TPM_LIMIT', '200000'))
+        )
+        try:
+            self.encoding = tiktoken.encoding_for_model(self.openai_model)
+        except KeyError:
+            self.encoding = tiktoken.get_encoding('o200k_base')
+        # Fixed prompt tokens around the markdown, counted once for the rate limiter
+        self.prompt_overhead_tokens = (
+            len(self.encoding.encode(SYSTEM_MESSAGE))
+            + len(self.encoding.encode(USER_MESSAGE_TEMPLATE.format(markdown_content='')))
+        )
+
+        # Extraction results keyed by model, prompt version and markdown content
+        self.cache_dir = Path(os.getenv('SUMMARY_CACHE_DIR', '.cache/summary_agent'))
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
 
         # Initialize failed files list
         self.failed_files = []
 
         logger.info("Initialized N8N Summary Agent")
 
+    async def close(self):
+        """Close the pooled HTTP connections"""
+        await self._http.aclose()
+
     def load_n8n_files(self, n8n_dir: str = "n8n") -> List[Dict[str, Any]]:
         """Load all JSON files from the n8n directory"""
         n8n_files = []
@@ -69,11 +179,16 @@ class N8NSummaryAgent:
         print("Всего json файлов: ", len(json_files))
         logger.info(f"Found {len(json_files)} JSON files in n8n directory")
 
-        for json_file in json_files:
-            try:
-                with open(json_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+        # Overlap file reads across threads; map keeps the order of json_files
+        with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as executor:
+            loaded = list(executor.map(_read_workflow_file, json_files))
 
+        for json_file, data, error in loaded:
+            if error is not None:
+                logger.error(f"Error loading {json_file.name}: {error}")
+                continue
+
+            try:
                 # Extract required fields
                 og_url = data.get('metadata', {}).get('ogUrl', '')
                 markdown_content = data.get('content', {}).get('markdown', '')
@@ -95,73 +210,41 @@ class N8NSummaryAgent:
         return n8n_files
 
     async def extract_content_with_openai(self, markdown_content: str, filename: str) -> Dict[str, Any]:
-        """Extract tags, short_description, and description using OpenAI API"""
+        """Extract tags, short_description, and description using OpenAI API
+
+        Raises on API or parsing errors after the SDK's retries are exhausted, and when
+        a REQUIRED_FIELDS value is missing from the result.
+        """
+        cache_key = hashlib.sha256(f"{self.openai_model}|{PROMPT_VERSION}|{markdown_content}".encode('utf-8')).hexdigest()
+        cache_path = self.cache_dir / f"{cache_key}.json"
+        if cache_path.exists():
+            try:
+                cached = json.loads(await asyncio.to_thread(cache_path.read_text, encoding='utf-8'))
+                # Entries cached before required fields were checked may be incomplete
+                if not _missing_required_fields(cached):
+                    logger.info(f"Using cached extraction for {filename}")
+                    return cached
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable cache entry for {filename}: {e}")
+
         try:
-            system_message = """You are an expert at analyzing n8n workflow documentation and extracting structured information. You will receive markdown content from an n8n workflow template page and must extract specific fields in JSON format.
-
-Your task is to analyze the content and extract:
-1. The workflow name and purpose
-2. Categories/tags from the page
-3. Technology stack (nodes, services, APIs used)
-4. Descriptions in both English and Russian
-
-Follow these extraction rules carefully:
-
-TAGS: Extract from "Categories" section only. Use exact category names as shown, convert to lowercase, remove special characters. If no Categories section exists, return empty array.
-
-STACK: Extract all mentioned nodes, services, APIs, and tools from the workflow description. Look for:
-- Node types (e.g., "HTTP Request Node", "Webhook Node", "Switch Node")
-- Services and APIs (e.g., "Fastmail API", "OpenAI")
-- Tools and platforms mentioned
-- Convert to lowercase, use 1-2 words per item, sort alphabetically
-
-NAME: Extract the exact workflow title as it appears in the content
-
-DESCRIPTIONS:
-- short_description: 2-3 words describing the main function
-- description: Detailed explanation of what the workflow does and how it works (max 3000 chars)
-
-Provide both English and Russian translations for names and descriptions."""
-
-            user_message = f"""Analyze this n8n workflow template content and extract the required fields in JSON format:
-
-{markdown_content}
-
-Return ONLY a valid JSON object with this exact structure:
-{{
-  "name": "string|null",
-  "name_ru": "string|null",
-  "short_description": "string|null",
-  "short_description_ru": "string|null",
-  "description": "string|null",
-  "description_ru": "string|null",
-  "tags": ["array of strings"],
-  "stack": ["array of strings"]
-}}
-
-Guidelines:
-- name: Exact workflow title as it appears in the content
-- name_ru: Russian translation of the exact name
-- short_description: 2-3 words describing main function (no punctuation)
-- short_description_ru: Russian translation of short_description
-- description: Detailed explanation of workflow functionality (max 3000 chars)
-- description_ru: Russian translation of description
-- tags: Categories from "Categories" section only, lowercase
-- stack: All nodes/services/APIs/tools mentioned, lowercase, 1-2 words each, sorted
-
-For the example file, expected output should have:
-- tags: ["personal productivity"]
-- stack: ["fastmail", "html", "http request", "switch", "webhook"]"""
-
-            response = await asyncio.to_thread(
-                self.openai_client.chat.completions.create,
+            # Cap the page by tokens so the prompt size is bounded regardless of the markdown length
+            tokens = self.encoding.encode(markdown_content, disallowed_special=())
+            if len(tokens) > MAX_MARKDOWN_TOKENS:
+                markdown_content = self.encoding.decode(tokens[:MAX_MARKDOWN_TOKENS])
+            user_message = USER_MESSAGE_TEMPLATE.format(markdown_content=markdown_content)
+
+            prompt_tokens = self.prompt_overhead_tokens + min(len(tokens), MAX_MARKDOWN_TOKENS)
+            await self.rate_limiter.acquire(prompt_tokens + MAX_COMPLETION_TOKENS)
+
+            response = await self.openai_client.chat.completions.create(
                 model=self.openai_model,
                 messages=[
-                    {"role": "system", "content": system_message},
+                    {"role": "system", "content": SYSTEM_MESSAGE},
                     {"role": "user", "content": user_message}
                 ],
                 temperature=0.1,  # Lower temperature for more consistent extraction
-                max_tokens=2000,
+                max_tokens=MAX_COMPLETION_TOKENS,
                 response_format={"type": "json_object"}  # Ensure JSON response
             )
 
@@ -172,25 +255,25 @@ For the example file, expected output should have:
                 extracted_data = json.loads(response_text)
 
                 # Validate required fields exist
-                required_fields = ["name", "name_ru", "short_description", "short_description_ru",
-                                 "description", "description_ru", "tags", "stack"]
-
-                for field in required_fields:
-                    if field not in extracted_data:
-                        extracted_data[field] = None if field not in ["tags", "stack"] else []
+                for field, default in EMPTY_EXTRACTION.items():
+                    extracted_data.setdefault(field, default)
 
                 # Clean and normalize arrays
-                if extracted_data.get("tags"):
-                    extracted_data["tags"] = sorted(list(set([
-                        tag.lower().strip() for tag in extracted_data["tags"] if tag and tag.strip()
-                    ])))
+                extracted_data["tags"] = _normalize_terms(extracted_data["tags"])
+                extracted_data["stack"] = _normalize_terms(extracted_data["stack"])
 
-                if extracted_data.get("stack"):
-                    extracted_data["stack"] = sorted(list(set([
-                        item.lower().strip() for item in extracted_data["stack"] if item and item.strip()
-                    ])))
+                # Incomplete results are neither cached nor written, so a re-run asks again
+                missing = _missing_required_fields(extracted_data)
+                if missing:
+                    raise ValueError(f"extraction returned no {', '.join(missing)}")
 
                 logger.info(f"Successfully extracted content for {filename}")
+                try:
+                    await asyncio.to_thread(
+                        cache_path.write_text, json.dumps(extracted_data, ensure_ascii=False), encoding='utf-8'
+                    )
+                except OSError as e:
+                    logger.warning(f"Could not cache extraction for {filename}: {e}")
                 return extracted_data
 
             except json.JSONDecodeError as e:
@@ -199,47 +282,34 @@ For the example file, expected output should have:
                 raise
 
         except Exception as e:
+            # Re-raise so process_workflow_file skips the update instead of writing empty fields
             logger.error(f"Error extracting content for {filename}: {e}")
-            return {
-                "name": None,
-                "name_ru": None,
-                "short_description": None,
-                "short_description_ru": None,
-                "description": None,
-                "description_ru": None,
-                "tags": [],
-                "stack": []
-            }
-
-    async def update_document_in_supabase(self, og_url: str, extracted_data: Dict[str, Any]) -> bool:
-        """Update document in Supabase using ogUrl to match with url column"""
+            raise
+
+    async def update_documents_in_supabase(self, rows: List[Dict[str, Any]]) -> set:
+        """Apply extracted fields to several documents with one bulk UPDATE matched on url
+
+        Returns:
+            URLs of the documents that were updated
+        """
         try:
-            # Update document where url matches og_url
             result = await asyncio.to_thread(
-                lambda: self.supabase.table('documents').update({
-                    'name_ru': extracted_data['name_ru'],
-                    'short_description': extracted_data['short_description'],
-                    'short_description_ru': extracted_data['short_description_ru'],
-                    'description': extracted_data['description'],
-                    'description_ru': extracted_data['description_ru'],
-                    'tags': extracted_data['tags'],
-                    'stack': extracted_data['stack']
-                }).eq('url', og_url).execute()
+                lambda: self.supabase.rpc('update_documents_by_url', {'rows': rows}).execute()
             )
-
-            if result.data:
-                logger.info(f"Successfully updated document with URL: {og_url}")
-                return True
-            else:
-                logger.warning(f"No document found with URL: {og_url}")
-                return False
+            updated_urls = {row['url'] for row in result.data or []}
+            logger.info(f"Updated {len(updated_urls)} of {len(rows)} documents")
+            return updated_urls
 
         except Exception as e:
-            logger.error(f"Error updating document with URL {og_url}: {e}")
-            return False
+            logger.error(f"Error updating {len(rows)} documents: {e}")
+            return set()
+
+    async def process_workflow_file(self, file_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Extract the fields of a single workflow file
 
-    async def process_workflow_file(self, file_data: Dict[str, Any]) -> bool:
-        """Process a single workflow file"""
+        Returns:
+            Row for update_documents_in_supabase, or None if the file failed
+        """
         filename = file_data['filename']
         og_url = file_data['og_url']
         markdown_content = file_data['markdown_content']
@@ -250,20 +320,16 @@ For the example file, expected output should have:
             # Extract content using OpenAI
             extracted_data = await self.extract_content_with_openai(markdown_content, filename)
 
-            # Update document in Supabase
-            success = await self.update_document_in_supabase(og_url, extracted_data)
-
-            if not success:
-                self.failed_files.append(filename)
-
-            return success
+            row = {field: extracted_data[field] for field in DOCUMENT_FIELDS}
+            row['url'] = og_url
+            return row
 
         except Exception as e:
             logger.error(f"Error processing workflow {filename}: {e}")
             self.failed_files.append(filename)
-            return False
+            return None
 
-    async def process_all_workflows(self, n8n_dir: str = "n8n", batch_size: int = 5):
+    async def process_all_workflows(self, n8n_dir: str = "n8n", concurrency: int = MAX_CONCURRENT_FILES):
         """Process all workflow files and update documents table"""
         logger.info("Starting N8N workflow processing")
 
@@ -275,35 +341,47 @@ For the example file, expected output should have:
                 return
 
             total_files = len(n8n_files)
-            processed = 0
             updated = 0
-            failed = 0
-
-            # Process files in batches to avoid overwhelming the APIs
-            for i in range(0, total_files, batch_size):
-                batch = n8n_files[i:i + batch_size]
-                logger.info(f"Processing batch {i//batch_size + 1}/{(total_files + batch_size - 1)//batch_size}")
 
-                # Process batch
-                tasks = []
-                for file_data in batch:
-                    tasks.append(self.process_workflow_file(file_data))
-
-                # Wait for batch to complete
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-
-                # Count results
-                for result in results:
-                    processed += 1
-                    if result is True:
+            # Each finished file frees its slot for the next one, instead of waiting on a whole batch
+            semaphore = asyncio.Semaphore(concurrency)
+            # (filename, row) pairs waiting for the next bulk update
+            pending = []
+
+            async def flush():
+                nonlocal updated
+                batch = pending[:]
+                pending.clear()
+                updated_urls = await self.update_documents_in_supabase([row for _, row in batch])
+                for filename, row in batch:
+                    if row['url'] in updated_urls:
                         updated += 1
                     else:
-                        failed += 1
-                        if isinstance(result, Exception):
-                            logger.error(f"Processing error: {result}")
+                        logger.warning(f"No document updated for {filename} (URL: {row['url']})")
+                        self.failed_files.append(filename)
+
+            async def process_with_limit(i: int, file_data: Dict[str, Any]):
+                async with semaphore:
+                    logger.info(f"Processing file {i}/{total_files}")
+                    row = await self.process_workflow_file(file_data)
+                if row is not None:
+                    pending.append((file_data['filename'], row))
+                    if len(pending) >= UPDATE_BATCH_SIZE:
+                        await flush()
+
+            results = await asyncio.gather(
+                *(process_with_limit(i, file_data) for i, file_data in enumerate(n8n_files, 1)),
+                return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error(f"Processing error: {result}")
 
-                # Small delay between batches
-                await asyncio.sleep(1)
+            if pending:
+                await flush()
+
+            processed = total_files
+            failed = processed - updated
 
             logger.info(f"Processing completed: {processed} processed, {updated} updated, {failed} failed")
 
@@ -323,7 +401,10 @@ async def main():
     """Main entry point"""
     try:
         agent = N8NSummaryAgent()
-        await agent.process_all_workflows()
+        try:
+            await agent.process_all_workflows()
+        finally:
+            await agent.close()
         logger.info("N8N workflow processing completed successfully!")
 
     except Exception as e:
@@ -15,6 +15,9 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 
 from bot.supabase_client.client import SupabaseClient
 
+# Uploads are independent HTTP inserts; run a bounded number at a time
+MAX_CONCURRENT_UPLOADS = 8
+
 class WorkflowUploader:
     def __init__(self, supabase_url: str, supabase_key: str):
         self.client = SupabaseClient(supabase_url, supabase_key)
@@ -81,18 +84,18 @@ class WorkflowUploader:
 
         print(f"Found {len(workflows)} workflows to upload")
 
-        successful_uploads = 0
-        failed_uploads = 0
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
 
-        for i, workflow in enumerate(workflows, 1):
-            print(f"\nProcessing workflow {i}/{len(workflows)}")
-            document_data = self.workflow_to_document(workflow)
+        async def upload_with_limit(i: int, workflow: Dict[str, str]) -> bool:
+            async with semaphore:
+                print(f"\nProcessing workflow {i}/{len(workflows)}")
+                return await self.upload_workflow(self.workflow_to_document(workflow))
 
-            success = await self.upload_workflow(document_data)
-            if success:
-                successful_uploads += 1
-            else:
-                failed_uploads += 1
+        results = await asyncio.gather(
+            *(upload_with_limit(i, workflow) for i, workflow in enumerate(workflows, 1))
+        )
+        successful_uploads = sum(results)
+        failed_uploads = len(results) - successful_uploads
 
         print(f"\n[SUCCESS] Upload completed!")
         print(f"[SUCCESS] Successful uploads: {successful_uploads}")